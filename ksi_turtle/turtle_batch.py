@@ -0,0 +1,99 @@
+"""
+Batch grading of many turtle submissions against one reference.
+
+The reference is rendered once, student command logs are rendered and
+compared in a process pool (one process per core by default) and results
+are yielded as soon as they are finished.
+
+Usage:
+    python3 -m ksi_turtle.turtle_batch REFERENCE STUDENT_LOG...
+REFERENCE is either a command log or a task *.py file defining
+draw_solution(turtle).
+"""
+
+import os
+import sys
+import time
+from multiprocessing import Pool
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional, Union
+
+from PIL import Image
+
+from .turtle_cache import REFERENCE_PEN_WIDTH, load_drawing_function
+from .turtle_compare import MAX_DIFFERENCE, MIN_ALPHA_DELTA, alpha_difference
+from .turtle_raster import render
+from .turtle_vector import record_drawing
+
+
+class BatchResult(NamedTuple):
+    student: str
+    difference: Optional[int]
+    ok: bool
+    error: Optional[str] = None
+
+
+# reference image of the worker process, set by _init_worker
+_reference: Optional[Image.Image] = None
+_pen_width = REFERENCE_PEN_WIDTH
+_max_difference = MAX_DIFFERENCE
+
+
+def _init_worker(mode: str, size, data: bytes, pen_width: int,
+                 max_difference: int) -> None:
+    global _reference, _pen_width, _max_difference
+    _reference = Image.frombytes(mode, size, data)
+    _pen_width = pen_width
+    _max_difference = max_difference
+
+
+def _grade(student: str) -> BatchResult:
+    try:
+        image = render(student, _pen_width)
+        difference = alpha_difference(image, _reference, MIN_ALPHA_DELTA)
+    except Exception as exc:  # pylint: disable=broad-except
+        return BatchResult(student, None, False, f'{type(exc).__name__}: {exc}')
+    return BatchResult(student, difference, difference <= _max_difference)
+
+
+def render_reference(reference: Union[str, Callable],
+                     pen_width: int = REFERENCE_PEN_WIDTH) -> Image.Image:
+    """Renders a command log, a task *.py file or a drawing function."""
+    if isinstance(reference, str) and reference.endswith('.py'):
+        reference = load_drawing_function(reference)
+    if callable(reference):
+        return render(record_drawing(reference), pen_width)
+    return render(reference, pen_width)
+
+
+def grade_batch(reference: Union[str, Callable], students: Iterable[str],
+                pen_width: int = REFERENCE_PEN_WIDTH,
+                max_difference: int = MAX_DIFFERENCE,
+                processes: Optional[int] = None) -> Iterator[BatchResult]:
+    """
+    Grades student command logs against the reference, yielding results
+    in the order they are finished.
+    """
+    image = render_reference(reference, pen_width)
+    initargs = (image.mode, image.size, image.tobytes(), pen_width,
+                max_difference)
+    with Pool(processes or os.cpu_count(), _init_worker, initargs) as pool:
+        yield from pool.imap_unordered(_grade, students)
+
+
+def main(argv=None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    reference, students = argv[0], argv[1:]
+    start = time.perf_counter()
+    count = 0
+    for result in grade_batch(reference, students):
+        count += 1
+        verdict = 'OK' if result.ok else 'NOK'
+        print(result.student, result.difference, verdict,
+              result.error or '', flush=True)
+    elapsed = time.perf_counter() - start
+    print(f'{count} submissions in {elapsed:.2f} s '
+          f'({count / elapsed:.1f} submissions/s)', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
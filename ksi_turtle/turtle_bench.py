@@ -0,0 +1,371 @@
+"""
+Benchmarks of the turtle grading pipeline.
+
+Usage:
+    python3 -m ksi_turtle.turtle_bench [micro]
+        calls per second of the sandbox turtle hot path
+    python3 -m ksi_turtle.turtle_bench pipeline [--sizes 1000,100000]
+            [--workloads koch,hilbert] [--stages sandbox,render]
+            [--output results.json] [--no-memory]
+        time and peak memory of every stage of the pipeline on synthetic
+        drawings, results are written as JSON (bench_output.txt by default)
+    python3 -m ksi_turtle.turtle_bench compare OLD.json NEW.json
+            [--threshold 0.1]
+        compares two runs, exits with status 1 if a stage got slower
+        by more than the threshold
+
+Stages needing Tk (with a display), Pillow or Ghostscript are reported
+as skipped when these are not available. Peak memory is measured by
+tracemalloc, i.e. it covers Python allocations only.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from . import turtle_sandbox
+from .turtle_log import read_log
+from .turtle_sandbox import KSI_WRITE_8kl, Turtle, Vec2D
+
+CALLS = 200_000
+
+
+def _forward() -> None:
+    t = Turtle()
+    for _ in range(CALLS):
+        t.forward(1)
+
+
+def _forward_right() -> None:
+    t = Turtle()
+    for _ in range(CALLS // 2):
+        t.forward(1)
+        t.right(1)
+
+
+def _clone() -> None:
+    t = Turtle()
+    for _ in range(CALLS):
+        t.clone()
+
+
+def _vec2d() -> None:
+    a = Vec2D(1.0, 2.0)
+    b = Vec2D(0.5, -1.0)
+    for _ in range(CALLS // 4):
+        a + b
+        a - b
+        a * 2.0
+        -a
+
+
+SANDBOX_BENCHMARKS: Dict[str, Callable[[], None]] = {
+    'forward': _forward,
+    'forward+right': _forward_right,
+    'clone': _clone,
+    'vec2d ops': _vec2d,
+}
+
+
+def run_sandbox(repeat: int = 5) -> Dict[str, float]:
+    """Returns calls per second of every benchmark (best of 'repeat')."""
+    results = {}
+    for name, benchmark in SANDBOX_BENCHMARKS.items():
+        best = min(timeit.repeat(benchmark, number=1, repeat=repeat,
+                                 setup=turtle_sandbox.KSI_TURTLE_8kl.clear))
+        turtle_sandbox.KSI_TURTLE_8kl.clear()
+        results[name] = CALLS / best
+    return results
+
+
+# synthetic drawings, each makes roughly 'size' segments
+
+def koch(t: Turtle, size: int) -> None:
+    order = max(0, round(math.log(max(size / 3, 1), 4)))
+    length = 600 / 3 ** order
+
+    def side(level: int) -> None:
+        if level == 0:
+            t.fd(length)
+            return
+        for angle in (60, -120, 60, 0):
+            side(level - 1)
+            t.left(angle)
+
+    t.penup()
+    t.goto(-300, 170)
+    t.pendown()
+    for _ in range(3):
+        side(order)
+        t.right(120)
+
+
+def hilbert(t: Turtle, size: int) -> None:
+    order = max(1, round(math.log(max(size, 1), 4)))
+    length = 600 / 2 ** order
+
+    def curve(level: int, angle: float) -> None:
+        if level == 0:
+            return
+        t.right(angle)
+        curve(level - 1, -angle)
+        t.fd(length)
+        t.left(angle)
+        curve(level - 1, angle)
+        t.fd(length)
+        curve(level - 1, angle)
+        t.left(angle)
+        t.fd(length)
+        curve(level - 1, -angle)
+        t.right(angle)
+
+    t.penup()
+    t.goto(-300, -300)
+    t.pendown()
+    curve(order, 90)
+
+
+def random_walk(t: Turtle, size: int) -> None:
+    rnd = random.Random(size)
+    for _ in range(size):
+        if rnd.random() < 0.1:
+            t.penup()
+        else:
+            t.pendown()
+        if abs(t.xcor()) > 500 or abs(t.ycor()) > 300:
+            t.home()
+        t.left(rnd.uniform(-90, 90))
+        t.fd(rnd.uniform(1, 20))
+
+
+def lines(t: Turtle, size: int) -> None:
+    for i in range(size):
+        t.fd(400)
+        t.right(179 if i % 2 else 181)
+
+
+WORKLOADS: Dict[str, Callable[[Turtle, int], None]] = {
+    'koch': koch,
+    'hilbert': hilbert,
+    'random_walk': random_walk,
+    'lines': lines,
+}
+
+
+# stages of the pipeline, they share the context dict
+
+def stage_sandbox(ctx: Dict[str, Any]) -> None:
+    turtle_sandbox.KSI_TURTLE_8kl.clear()
+    WORKLOADS[ctx['workload']](Turtle(), ctx['size'])
+    ctx['records'] = len(turtle_sandbox.KSI_TURTLE_8kl)
+
+
+def stage_write_text(ctx: Dict[str, Any]) -> None:
+    KSI_WRITE_8kl(ctx['text'])
+
+
+def stage_write_binary(ctx: Dict[str, Any]) -> None:
+    KSI_WRITE_8kl(ctx['binary'], binary=True)
+
+
+def stage_read_text(ctx: Dict[str, Any]) -> None:
+    ctx['log'] = read_log(ctx['text'])
+
+
+def stage_read_binary(ctx: Dict[str, Any]) -> None:
+    ctx['log'] = read_log(ctx['binary'])
+
+
+def stage_render(ctx: Dict[str, Any]) -> None:
+    from .turtle_raster import render
+    ctx['image'] = render(ctx['log'])
+
+
+def stage_alpha_difference(ctx: Dict[str, Any]) -> None:
+    from .turtle_compare import alpha_difference
+    alpha_difference(ctx['image'], ctx['image'])
+
+
+def _tk_turtle() -> Any:
+    from turtle import Turtle as TkTurtle, resetscreen, tracer
+    resetscreen()
+    tracer(0, 0)
+    return TkTurtle()
+
+
+def stage_interpret_turtle(ctx: Dict[str, Any]) -> None:
+    from .turtle_eval import interpret_turtle, update
+    interpret_turtle(ctx['log'], _tk_turtle())
+    update()
+
+
+def stage_interpret_turtle_fast(ctx: Dict[str, Any]) -> None:
+    from .turtle_eval import interpret_turtle
+    interpret_turtle(ctx['log'], _tk_turtle(), fast=True)
+
+
+def stage_store_current_image(ctx: Dict[str, Any]) -> None:
+    from .turtle_eval import store_current_image
+    store_current_image(ctx['eps'])
+
+
+def stage_load_image(ctx: Dict[str, Any]) -> None:
+    from .turtle_eval import load_image
+    load_image(ctx['eps'])
+
+
+def stage_compare_solutions(ctx: Dict[str, Any]) -> None:
+    from .turtle_eval import compare_solutions
+    compare_solutions(ctx['eps'], ctx['eps'])
+
+
+STAGES: Dict[str, Callable[[Dict[str, Any]], None]] = {
+    'sandbox': stage_sandbox,
+    'write_text': stage_write_text,
+    'write_binary': stage_write_binary,
+    'read_text': stage_read_text,
+    'read_binary': stage_read_binary,
+    'render': stage_render,
+    'alpha_difference': stage_alpha_difference,
+    'interpret_turtle': stage_interpret_turtle,
+    'interpret_turtle_fast': stage_interpret_turtle_fast,
+    'store_current_image': stage_store_current_image,
+    'load_image': stage_load_image,
+    'compare_solutions': stage_compare_solutions,
+}
+
+
+def _measure(stage: Callable[[Dict[str, Any]], None], ctx: Dict[str, Any],
+             memory: bool) -> Dict[str, Any]:
+    """
+    Runs the stage once timed and, with 'memory', once more under
+    tracemalloc for the peak memory (tracing slows it down too much to
+    take both from one run).
+    """
+    start = time.perf_counter()
+    stage(ctx)
+    result: Dict[str, Any] = {'seconds': time.perf_counter() - start}
+    if memory:
+        tracemalloc.start()
+        try:
+            stage(ctx)
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run_pipeline(sizes: List[int], workloads: List[str], stages: List[str],
+                 memory: bool = True) -> List[Dict[str, Any]]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for workload in workloads:
+            for size in sizes:
+                ctx: Dict[str, Any] = {
+                    'workload': workload,
+                    'size': size,
+                    'text': os.path.join(tmp, 'log.txt'),
+                    'binary': os.path.join(tmp, 'log.bin'),
+                    'eps': os.path.join(tmp, 'student.eps'),
+                }
+                for name in stages:
+                    entry: Dict[str, Any] = {'workload': workload,
+                                             'size': size, 'stage': name}
+                    try:
+                        entry.update(_measure(STAGES[name], ctx, memory))
+                    except Exception as exc:  # pylint: disable=broad-except
+                        entry['skipped'] = f'{type(exc).__name__}: {exc}'
+                    entry['records'] = ctx.get('records')
+                    results.append(entry)
+                    print(_format_entry(entry), file=sys.stderr)
+    turtle_sandbox.KSI_TURTLE_8kl.clear()
+    return results
+
+
+def _format_entry(entry: Dict[str, Any]) -> str:
+    name = f"{entry['workload']:>11} {entry['size']:>8} {entry['stage']:>22}"
+    if 'skipped' in entry:
+        return f"{name}: skipped ({entry['skipped']})"
+    memory = ''
+    if 'peak_bytes' in entry:
+        memory = f", peak {entry['peak_bytes'] / 2**20:8.2f} MiB"
+    return f"{name}: {entry['seconds']:9.4f} s{memory}"
+
+
+def compare_runs(old: List[Dict[str, Any]], new: List[Dict[str, Any]],
+                 threshold: float = 0.1) -> bool:
+    """Prints the comparison, returns False if something got slower."""
+    def key(entry: Dict[str, Any]) -> Any:
+        return entry['workload'], entry['size'], entry['stage']
+
+    old_by_key = {key(entry): entry for entry in old if 'seconds' in entry}
+    ok = True
+    for entry in new:
+        before = old_by_key.get(key(entry))
+        if before is None or 'seconds' not in entry:
+            continue
+        ratio = entry['seconds'] / before['seconds'] \
+            if before['seconds'] else math.inf
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            ok = False
+        elif ratio < 1 - threshold:
+            flag = '  faster'
+        print(f"{entry['workload']:>11} {entry['size']:>8} "
+              f"{entry['stage']:>22}: {before['seconds']:9.4f} s -> "
+              f"{entry['seconds']:9.4f} s ({ratio:6.2f}x){flag}")
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('micro')
+    pipeline = commands.add_parser('pipeline')
+    pipeline.add_argument('--sizes', default='1000,10000,100000')
+    pipeline.add_argument('--workloads', default=','.join(WORKLOADS))
+    pipeline.add_argument('--stages', default=','.join(STAGES))
+    pipeline.add_argument('--output', default='bench_output.txt')
+    pipeline.add_argument('--no-memory', action='store_true')
+    compare = commands.add_parser('compare')
+    compare.add_argument('old')
+    compare.add_argument('new')
+    compare.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    if args.command == 'pipeline':
+        results = run_pipeline([int(size) for size in args.sizes.split(',')],
+                               args.workloads.split(','),
+                               args.stages.split(','),
+                               memory=not args.no_memory)
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': sys.version,
+                'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'results': results,
+            }, f, indent=1)
+    elif args.command == 'compare':
+        with open(args.old) as f:
+            old = json.load(f)['results']
+        with open(args.new) as f:
+            new = json.load(f)['results']
+        if not compare_runs(old, new, args.threshold):
+            sys.exit(1)
+    else:
+        for name, calls_per_second in run_sandbox().items():
+            print(f'{name:>15}: {calls_per_second / 1e6:6.2f} M calls/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Persistent content-addressed cache of reference solution renderings.
+
+The key is a hash of the teacher's drawing function source (or of the command
+log), the canvas geometry and the pen settings, so a reference is rendered
+only once per machine. The cache directory is limited by its total size,
+the least recently used renderings are evicted first.
+
+Warm-up of a whole task catalog:
+    python3 -m ksi_turtle.turtle_cache task1.py task2.py solution.txt ...
+(*.py files have to define draw_solution(turtle), other files are command
+logs written by turtle_sandbox).
+"""
+
+import hashlib
+import importlib.util
+import inspect
+import marshal
+import os
+import sys
+import tempfile
+from typing import Any, Callable, Iterable, List, Optional, Union
+
+from .turtle_raster import HEIGHT, PEN_WIDTH, WIDTH, render
+
+DEFAULT_DIRECTORY = os.environ.get(
+    'KSI_TURTLE_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'ksi_turtle')
+)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# pensize used by turtle_eval.store_image
+REFERENCE_PEN_WIDTH = 3
+REFERENCE_COLORS = (None, '#cc2233')
+
+
+def _hash(data: bytes, **settings: Any) -> str:
+    h = hashlib.sha256(data)
+    for name in sorted(settings):
+        h.update(f'\0{name}={settings[name]!r}'.encode('utf-8'))
+    return h.hexdigest()
+
+
+def drawing_key(drawing_function: Callable, **settings: Any) -> str:
+    """
+    Key of a rendering of the drawing function. Only the function itself is
+    hashed, not the helpers it calls.
+    """
+    try:
+        data = inspect.getsource(drawing_function).encode('utf-8')
+    except (OSError, TypeError):
+        # e.g. function defined in exec'd code, hash its bytecode instead
+        data = marshal.dumps(drawing_function.__code__)
+    return _hash(data, **settings)
+
+
+def log_key(file: Union[str, List[str]], **settings: Any) -> str:
+    """Key of a rendering of the command log (file name or list of lines)."""
+    if isinstance(file, list):
+        data = '\n'.join(line.rstrip('\n') for line in file).encode('utf-8')
+    else:
+        with open(file, 'rb') as f:
+            data = f.read()
+    return _hash(data, **settings)
+
+
+class ReferenceCache:
+    """Directory of rendered images named by their keys."""
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY,
+                 max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # renderings in progress, kept apart so that evict() skips them
+        self.tmp_directory = os.path.join(directory, 'tmp')
+        os.makedirs(self.tmp_directory, exist_ok=True)
+
+    def path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, key + suffix)
+
+    def fetch(self, key: str, produce: Callable[[str], None],
+              suffix: str) -> str:
+        """
+        Returns path of the cached image. On a miss, produce(path) is called
+        to render the image first.
+        """
+        path = self.path(key, suffix)
+        if os.path.exists(path):
+            os.utime(path)  # mark as recently used
+            return path
+
+        fd, tmp_path = tempfile.mkstemp(suffix=suffix,
+                                        dir=self.tmp_directory)
+        os.close(fd)
+        try:
+            produce(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """
+        Removes the least recently used images above max_bytes (renderings
+        in progress are not counted).
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+_default_cache: Optional[ReferenceCache] = None
+
+
+def default_cache() -> ReferenceCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ReferenceCache()
+    return _default_cache
+
+
+def cached_drawing(drawing_function: Callable, color: Optional[str] = None,
+                   cache: Optional[ReferenceCache] = None) -> str:
+    """
+    Returns path of the EPS rendered by turtle_eval.store_image
+    for the drawing function. Tk is needed only on a cache miss.
+    """
+    if cache is None:
+        cache = default_cache()
+    key = drawing_key(drawing_function, renderer='tk', width=WIDTH,
+                      height=HEIGHT, pen_width=REFERENCE_PEN_WIDTH,
+                      color=color)
+
+    def produce(name: str) -> None:
+        from turtle import Turtle
+        from .turtle_eval import store_image
+        store_image(Turtle(), drawing_function, name, color)
+
+    return cache.fetch(key, produce, '.eps')
+
+
+def cached_log(file: Union[str, List[str]], pen_width: int = PEN_WIDTH,
+               color: Optional[str] = None,
+               cache: Optional[ReferenceCache] = None) -> str:
+    """Returns path of the PNG rendered by turtle_raster for the log."""
+    if cache is None:
+        cache = default_cache()
+    key = log_key(file, renderer='raster', width=WIDTH, height=HEIGHT,
+                  pen_width=pen_width, color=color)
+
+    def produce(name: str) -> None:
+        render(file, pen_width, color).save(name, 'PNG')
+
+    return cache.fetch(key, produce, '.png')
+
+
+def load_drawing_function(filename: str) -> Callable:
+    """Returns draw_solution defined in the task file."""
+    spec = importlib.util.spec_from_file_location('ksi_task', filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)  # type: ignore
+    return module.draw_solution  # type: ignore
+
+
+def warm_up(catalog: Iterable[Union[str, Callable]],
+            cache: Optional[ReferenceCache] = None) -> int:
+    """
+    Pre-renders references (black and coloured) of the whole catalog.
+    Items are drawing functions, task *.py files defining draw_solution,
+    or command log files. Returns the number of rendered references.
+    """
+    count = 0
+    for item in catalog:
+        if isinstance(item, str) and item.endswith('.py'):
+            item = load_drawing_function(item)
+        for color in REFERENCE_COLORS:
+            if callable(item):
+                cached_drawing(item, color, cache)
+            else:
+                cached_log(item, REFERENCE_PEN_WIDTH, color, cache)
+            count += 1
+    return count
+
+
+if __name__ == '__main__':
+    print(f'{warm_up(sys.argv[1:])} references cached in {DEFAULT_DIRECTORY}')
@@ -0,0 +1,214 @@
+"""
+Pixel difference engine for turtle tasks.
+Works on whole alpha channels at once (Pillow ImageChops + lookup table)
+instead of walking the PixelAccess object pixel by pixel.
+"""
+
+import os
+import tempfile
+from itertools import accumulate
+from typing import Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from PIL import Image, ImageChops, ImageFilter
+
+# jak moc musi byt pixely alespon rozdilne, aby byl zapocitan rozdil
+MIN_ALPHA_DELTA = 100
+# kolik pixelu muze byt ruznych, aby byly obrazky povazovane za stejne
+MAX_DIFFERENCE = 50
+
+TILE_SIZE = 128
+
+Box = Tuple[int, int, int, int]
+
+
+def load_alpha(name) -> Image.Image:
+    """Returns the last band of the image (the one compared when grading)."""
+    # NOTE: PIL umi pracovat primo s EPS
+    im = Image.open(name)
+    return im.split()[-1]
+
+
+def difference_mask(student: Image.Image, solution: Image.Image,
+                    min_alpha_delta: int = MIN_ALPHA_DELTA) -> Image.Image:
+    """
+    Returns a mode "L" mask which is 255 where the pixels differ by at least
+    'min_alpha_delta' and 0 elsewhere.
+    """
+    assert student.size == solution.size, 'Obrazky nejsou stejne velke!'
+    lut = [255 if value >= min_alpha_delta else 0 for value in range(256)]
+    return ImageChops.difference(student, solution).point(lut)
+
+
+def alpha_difference(student: Image.Image, solution: Image.Image,
+                     min_alpha_delta: int = MIN_ALPHA_DELTA) -> int:
+    """Returns the number of pixels differing by at least 'min_alpha_delta'."""
+    return difference_mask(student, solution, min_alpha_delta).histogram()[255]
+
+
+def region_differences(student: Image.Image, solution: Image.Image,
+                       regions: Iterable[Box],
+                       min_alpha_delta: int = MIN_ALPHA_DELTA) -> List[int]:
+    """
+    Returns the number of differing pixels inside each of the 'regions'
+    given as (left, upper, right, lower) boxes.
+    """
+    mask = difference_mask(student, solution, min_alpha_delta)
+    return [mask.crop(box).histogram()[255] for box in regions]
+
+
+def _histogram_bound(student: Image.Image, solution: Image.Image,
+                     min_alpha_delta: int) -> int:
+    """
+    Lower bound of the number of differing pixels computed from histograms
+    only: every pixel with a <= t either has b >= t + delta (it differs)
+    or b < t + delta, hence differences >= #(a <= t) - #(b < t + delta).
+    """
+    bound = 0
+    for a, b in ((student, solution), (solution, student)):
+        at_most = list(accumulate(a.histogram()))
+        at_most_b = list(accumulate(b.histogram()))
+        for t in range(256 - min_alpha_delta):
+            below = at_most_b[t + min_alpha_delta - 1] \
+                if t + min_alpha_delta > 0 else 0
+            bound = max(bound, at_most[t] - below)
+    return bound
+
+
+def bounded_difference(student: Image.Image, solution: Image.Image,
+                       limit: Optional[int] = MAX_DIFFERENCE,
+                       min_alpha_delta: int = MIN_ALPHA_DELTA) -> int:
+    """
+    Returns the number of differing pixels if it is at most 'limit',
+    otherwise any number greater than 'limit' (the comparison stops as soon
+    as the limit is crossed). With limit=None the exact count is returned.
+
+    Only the union bounding box of the inked pixels is compared, first
+    by a cheap histogram bound, then tile by tile.
+    """
+    assert student.size == solution.size, 'Obrazky nejsou stejne velke!'
+    if limit is None:
+        return alpha_difference(student, solution, min_alpha_delta)
+
+    # a differing pixel is inked in at least one of the images
+    box = ink_mask(ImageChops.darker(student, solution),
+                   min_alpha_delta).getbbox()
+    if box is None:
+        return 0
+    student = student.crop(box)
+    solution = solution.crop(box)
+
+    bound = _histogram_bound(student, solution, min_alpha_delta)
+    if bound > limit:
+        return bound
+
+    width, height = student.size
+    difference = 0
+    for top in range(0, height, TILE_SIZE):
+        for left in range(0, width, TILE_SIZE):
+            tile = (left, top, min(left + TILE_SIZE, width),
+                    min(top + TILE_SIZE, height))
+            difference += alpha_difference(student.crop(tile),
+                                           solution.crop(tile),
+                                           min_alpha_delta)
+            if difference > limit:
+                return difference
+    return difference
+
+
+def exceeds_difference(student: Image.Image, solution: Image.Image,
+                       max_difference: int = MAX_DIFFERENCE,
+                       min_alpha_delta: int = MIN_ALPHA_DELTA) -> bool:
+    """True if more than 'max_difference' pixels differ."""
+    return bounded_difference(student, solution, max_difference,
+                              min_alpha_delta) > max_difference
+
+
+class ToleranceScore(NamedTuple):
+    """
+    precision: part of the student's ink near the reference ink,
+    recall: part of the reference ink near the student's ink.
+    """
+    precision: float
+    recall: float
+
+
+def ink_mask(alpha: Image.Image,
+             min_alpha_delta: int = MIN_ALPHA_DELTA) -> Image.Image:
+    """
+    Returns a mode "L" mask which is 255 where the pixel differs from
+    the white background by at least 'min_alpha_delta'.
+    """
+    lut = [255 if 255 - value >= min_alpha_delta else 0
+           for value in range(256)]
+    return alpha.point(lut)
+
+
+def dilate(mask: Image.Image, tolerance: int) -> Image.Image:
+    """Grows the mask by 'tolerance' pixels in every direction."""
+    if tolerance <= 0:
+        return mask
+    return mask.filter(ImageFilter.MaxFilter(2 * tolerance + 1))
+
+
+def reference_mask(name: str, tolerance: int,
+                   min_alpha_delta: int = MIN_ALPHA_DELTA) -> Image.Image:
+    """
+    Returns the dilated ink mask of the reference image (tolerance 0 gives
+    the ink mask itself). The mask is cached in a PNG file next to
+    the reference and recomputed when it is older.
+    """
+    cached = f'{name}.tol{tolerance}-{min_alpha_delta}.png'
+    if (os.path.exists(cached)
+            and os.path.getmtime(cached) >= os.path.getmtime(name)):
+        return Image.open(cached)
+    if tolerance > 0:
+        mask = dilate(reference_mask(name, 0, min_alpha_delta), tolerance)
+    else:
+        mask = ink_mask(load_alpha(name), min_alpha_delta)
+    # written under a temporary name, other graders may read the cache
+    fd, tmp_name = tempfile.mkstemp(suffix='.png',
+                                    dir=os.path.dirname(cached) or '.')
+    os.close(fd)
+    try:
+        mask.save(tmp_name)
+        os.replace(tmp_name, cached)
+    except BaseException:
+        os.remove(tmp_name)
+        raise
+    return mask
+
+
+def _count(mask: Image.Image) -> int:
+    return mask.histogram()[255]
+
+
+def tolerance_score(student: Image.Image,
+                    solution: Union[str, Image.Image],
+                    tolerance: int = 1,
+                    min_alpha_delta: int = MIN_ALPHA_DELTA) -> ToleranceScore:
+    """
+    Scores the student's alpha channel against the reference, ignoring
+    strokes shifted by at most 'tolerance' pixels. The reference is either
+    a file name (its ink masks are cached) or an alpha channel.
+    """
+    if isinstance(solution, str):
+        solution_near = reference_mask(solution, tolerance, min_alpha_delta)
+        solution_ink = reference_mask(solution, 0, min_alpha_delta)
+    else:
+        solution_ink = ink_mask(solution, min_alpha_delta)
+        solution_near = dilate(solution_ink, tolerance)
+    assert student.size == solution_ink.size, 'Obrazky nejsou stejne velke!'
+    student_ink = ink_mask(student, min_alpha_delta)
+
+    student_total = _count(student_ink)
+    solution_total = _count(solution_ink)
+    matched_student = _count(ImageChops.darker(student_ink, solution_near))
+    if solution_total and student_total:
+        matched_solution = _count(ImageChops.darker(
+            solution_ink, dilate(student_ink, tolerance)))
+    else:
+        matched_solution = 0
+    return ToleranceScore(
+        precision=matched_student / student_total if student_total else 1.0,
+        recall=matched_solution / solution_total if solution_total else 1.0,
+    )
@@ -3,9 +3,13 @@ Evaluation script for turtle tasks.
 Requires Pillow library (pip install Pillow) for working with images.
 """
 
-from turtle import Turtle, getcanvas, resetscreen
+import shutil
+from turtle import getcanvas, resetscreen
 from PIL import Image
 
+from .turtle_cache import cached_drawing
+from .turtle_compare import alpha_difference, load_alpha
+
 # nastaveni
 STUDENT_FILE_NAME = '/tmp/student.eps'
 CORRECT_SOLUTION_FILE_NAME = 'correct-solution'
@@ -33,29 +37,18 @@ def load_image(name):
 
 
 
-# NOTE: pre_evaluation by stacilo spustit jen jednou (pred vsemi vyhodnocenimi)
+# vzorova reseni se vykresli jen jednou, pak se berou z cache (turtle_cache)
 def pre_evaluation():
-    julie = Turtle()
     # vzorove reseni cerne
-    store_image(julie, draw_solution, name=CORRECT_SOLUTION_FILE_NAME)
+    shutil.copyfile(cached_drawing(draw_solution), CORRECT_SOLUTION_FILE_NAME)
     # vzorove reseni cervene
-    store_image(julie, draw_solution, name=CORRECT_SOLUTION_COLOR_FILE_NAME, color='#cc2233')
+    shutil.copyfile(cached_drawing(draw_solution, color='#cc2233'),
+                    CORRECT_SOLUTION_COLOR_FILE_NAME)
 
 
 def compare_solutions():
-    values1, width1, height1 = load_image(CORRECT_SOLUTION_FILE_NAME)
-    values2, width2, height2 = load_image(STUDENT_FILE_NAME)
-    assert width1 == width2 and height1 == height2, 'Obrazky nejsou stejne velke!'
-    difference = 0
-    for x in range(width1):
-        for y in range(height1):
-            key = (x, y)
-            value1 = values1[key]
-            value2 = values2[key]
-            delta = abs(value1 - value2)
-            if delta >= MIN_ALPHA_DELTA:
-                difference += 1
-    return difference
+    return alpha_difference(load_alpha(CORRECT_SOLUTION_FILE_NAME),
+                            load_alpha(STUDENT_FILE_NAME), MIN_ALPHA_DELTA)
 
 
 
@@ -1,9 +1,12 @@
 import sys
+from tkinter import ROUND
 from turtle import Turtle, getcanvas, resetscreen, screensize, tracer, update
 from PIL import Image, ImageOps
 import math
 
-MIN_ALPHA_DELTA = 100
+from .turtle_compare import MIN_ALPHA_DELTA, alpha_difference, load_alpha
+from .turtle_log import (OP_CIRCLE, OP_DOT, OP_FD, OP_GOTO, OP_HOME, OP_STAMP,
+                         end_state, iter_paths, read_log)
 
 
 def load_image(name):
@@ -43,54 +46,88 @@ def combine_images(front, back, result):
     b.paste(f, (0, 0), ImageOps.invert(f.split()[-1]))
     b.save(result)
 
-def interpret_turtle(file, turtle):
+def interpret_turtle(file, turtle, fast=False):
+    """
+    Replays the command log with the Tk turtle. With fast=True, consecutive
+    pen-down moves are drawn directly on the canvas as polylines (the same
+    line items the turtle itself would create), which is much faster.
+    """
     turtle.speed(0)
-    if not isinstance(file, list):
-        f = open(file, "r")
-        lines = f.readlines()
-        f.close()
-    else:
-        lines = file
-
-    for line in lines:
-        if len(line.strip()) == 0 or '#KSI_META_OUTPUT_0a859a#' in line:
-            continue
-
-        s = line.split(" ")
-        
+    log = read_log(file)
+    if fast:
+        _replay_polylines(log, turtle)
+        return
+
+    for x, y, direction, a0, a1, a2, op, pen in zip(*log.columns()):
         turtle.penup()
-        turtle.setx(float(s[0]))
-        turtle.sety(float(s[1]))
-        heading_degrees = math.degrees(float(s[2]))
+        turtle.setx(x)
+        turtle.sety(y)
+        heading_degrees = math.degrees(direction)
         turtle.seth(heading_degrees)
         turtle.pendown()
 
-        if s[3] == "d":
+        if pen:
             turtle.down()
         else:
             turtle.up()
 
-        if s[4] == "fd":
-            turtle.fd(float(s[5]))
-        elif s[4] == "goto":
-            turtle.goto(float(s[5]), float(s[6]))
-        elif s[4] == "home":
+        if op == OP_FD:
+            turtle.fd(a0)
+        elif op == OP_GOTO:
+            turtle.goto(a0, a1)
+        elif op == OP_HOME:
             turtle.home()
+        elif op == OP_CIRCLE:
+            turtle.circle(a0, math.degrees(a1), int(a2))
+        elif op == OP_DOT:
+            turtle.dot(a0)
+        elif op == OP_STAMP:
+            turtle.stamp()
+
+def _replay_polylines(log, turtle):
+    if len(log) == 0:
+        return
+    canvas = turtle.getscreen().getcanvas()
+    # _pencolor is the Tk colour string used by the turtle for its lines
+    options = dict(fill=turtle._pencolor, width=turtle.pensize(),
+                   capstyle=ROUND)
+    points = []
+    end = None
+    for path in iter_paths(log):
+        if path[0] != end:
+            if len(points) >= 4:
+                canvas.create_line(*points, **options)
+            points = [path[0][0], -path[0][1]]
+        for x, y in path[1:]:
+            points.extend((x, -y))
+        end = path[-1]
+    if len(points) >= 4:
+        canvas.create_line(*points, **options)
+
+    # dots and stamps are rare, let the turtle draw them
+    for i, op in enumerate(log.op):
+        if op == OP_DOT or op == OP_STAMP:
+            turtle.penup()
+            turtle.goto(log.x[i], log.y[i])
+            turtle.seth(math.degrees(log.dir[i]))
+            if op == OP_DOT:
+                turtle.dot(log.a0[i])
+            else:
+                turtle.stamp()
+
+    # leave the turtle in the state after the last command
+    last = len(log) - 1
+    x, y, direction = end_state(log, last)
+    turtle.penup()
+    turtle.goto(x, y)
+    turtle.seth(math.degrees(direction))
+    if log.pen[last]:
+        turtle.pendown()
+    update()
 
 def compare_solutions(student, solution):
-    values1, width1, height1 = load_image(student)
-    values2, width2, height2 = load_image(solution)
-    assert width1 == width2 and height1 == height2, 'Obrazky nejsou stejne velke!'
-    difference = 0
-    for x in range(width1):
-        for y in range(height1):
-            key = (x, y)
-            value1 = values1[key]
-            value2 = values2[key]
-            delta = abs(value1 - value2)
-            if delta >= MIN_ALPHA_DELTA:
-                difference += 1
-    return difference
+    return alpha_difference(load_alpha(student), load_alpha(solution),
+                            MIN_ALPHA_DELTA)
 
 
 def convert_eps_to_png(input_filename: str, output_filename: str):
@@ -0,0 +1,259 @@
+"""
+Reader of the command log written by turtle_sandbox.KSI_WRITE_8kl.
+
+Every record describes the turtle state *before* the command
+(x, y, heading in radians, pen) followed by the command and its arguments:
+    x y dir pen fd step
+    x y dir pen goto new_x new_y
+    x y dir pen home
+    x y dir pen circle radius extent steps
+    x y dir pen dot size
+    x y dir pen stamp
+(extent of the arc is in radians as well).
+
+The log is either text (one record per line) or the compact binary format:
+the magic bytes followed by blocks, each block is a little-endian uint32
+record count and the columns x, y, dir, arg0, arg1, arg2 (float64) and
+op, pen (uint8). Version 1 of the format has no arg2 column.
+"""
+
+import math
+import struct
+import sys
+from array import array
+from typing import Iterator, List, Sequence, Tuple, Union
+
+META_OUTPUT = '#KSI_META_OUTPUT_0a859a#'
+
+# keep in sync with turtle_sandbox.py
+OPCODES = ("fd", "goto", "home", "circle", "dot", "stamp")
+OP_FD, OP_GOTO, OP_HOME, OP_CIRCLE, OP_DOT, OP_STAMP = range(6)
+NARGS = (1, 2, 0, 3, 1, 0)
+PENS = ("u", "d")
+MAGIC_PREFIX = b"KSI8kl\x00"
+MAGIC = MAGIC_PREFIX + b"\x02"
+
+# turtle shape "classic" used by stamp
+CLASSIC_SHAPE = ((0, 0), (-5, -9), (0, -7), (5, -9))
+
+Record = Tuple
+Point = Tuple[float, float]
+Segment = Tuple[float, float, float, float]
+
+
+class CommandLog:
+    """Columns of the command log (see the module docstring)."""
+
+    __slots__ = ('x', 'y', 'dir', 'a0', 'a1', 'a2', 'op', 'pen')
+
+    def __init__(self) -> None:
+        self.x = array('d')
+        self.y = array('d')
+        self.dir = array('d')
+        self.a0 = array('d')
+        self.a1 = array('d')
+        self.a2 = array('d')
+        self.op = array('B')
+        self.pen = array('B')
+
+    def columns(self) -> Tuple[array, ...]:
+        return (self.x, self.y, self.dir, self.a0, self.a1, self.a2,
+                self.op, self.pen)
+
+    def __len__(self) -> int:
+        return len(self.op)
+
+    def append(self, record: Record) -> None:
+        """Appends a record given as a tuple of the text format."""
+        args = tuple(record[5:]) + (0.0, 0.0, 0.0)
+        self.x.append(record[0])
+        self.y.append(record[1])
+        self.dir.append(record[2])
+        self.a0.append(args[0])
+        self.a1.append(args[1])
+        self.a2.append(args[2])
+        self.op.append(OPCODES.index(record[4]))
+        self.pen.append(PENS.index(record[3]))
+
+    def record(self, i: int) -> Record:
+        """Returns the i-th record as a tuple of the text format."""
+        op = self.op[i]
+        args = (self.a0[i], self.a1[i], self.a2[i])[:NARGS[op]]
+        return (self.x[i], self.y[i], self.dir[i], PENS[self.pen[i]],
+                OPCODES[op], *args)
+
+    def records(self) -> Iterator[Record]:
+        for i in range(len(self)):
+            yield self.record(i)
+
+
+def parse_line(line: str) -> Record:
+    """Parses one text record of the command log."""
+    s = line.split()
+    return (float(s[0]), float(s[1]), float(s[2]), s[3], s[4],
+            *(float(arg) for arg in s[5:]))
+
+
+def _read_binary(data: bytes) -> CommandLog:
+    log = CommandLog()
+    columns = log.columns()
+    if data[len(MAGIC_PREFIX)] == 1:
+        # version 1 has no arg2 column
+        columns = columns[:5] + columns[6:]
+    offset = len(MAGIC)
+    while offset < len(data):
+        count, = struct.unpack_from('<I', data, offset)
+        offset += 4
+        if len(columns) < len(log.columns()):
+            log.a2.extend([0.0] * count)
+        for column in columns:
+            size = count * column.itemsize
+            block = array(column.typecode)
+            block.frombytes(data[offset:offset + size])
+            if sys.byteorder == 'big' and column.itemsize > 1:
+                block.byteswap()
+            column.extend(block)
+            offset += size
+    return log
+
+
+def _read_text(lines: List[str]) -> CommandLog:
+    log = CommandLog()
+    for line in lines:
+        if len(line.strip()) != 0 and META_OUTPUT not in line:
+            log.append(parse_line(line))
+    return log
+
+
+def read_log(file: Union[str, List]) -> CommandLog:
+    """
+    Reads the command log from a file name (binary or text format),
+    from a list of its text lines or from a list of records.
+    """
+    if isinstance(file, list):
+        if file and not isinstance(file[0], str):
+            log = CommandLog()
+            for record in file:
+                log.append(record)
+            return log
+        return _read_text(file)
+
+    with open(file, 'rb') as f:
+        data = f.read()
+    if data.startswith(MAGIC_PREFIX):
+        return _read_binary(data)
+    return _read_text(data.decode('utf-8').splitlines())
+
+
+def write_log(log: CommandLog, filename: str, binary: bool = True) -> None:
+    """Writes the command log in the binary (or text) format."""
+    if not binary:
+        with open(filename, 'w') as f:
+            f.write('\n' + META_OUTPUT)
+            for record in log.records():
+                f.write('\n' + ' '.join(str(x) for x in record))
+        return
+
+    with open(filename, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(log)))
+        for column in log.columns():
+            if sys.byteorder == 'big' and column.itemsize > 1:
+                column = array(column.typecode, column)
+                column.byteswap()
+            column.tofile(f)
+
+
+def read_records(file: Union[str, List]) -> List[Record]:
+    """Reads the command log as a list of tuples of the text format."""
+    return list(read_log(file).records())
+
+
+def arc_points(x: float, y: float, direction: float, radius: float,
+               extent: float, steps: int) -> List[Point]:
+    """
+    Returns vertices of the polygon drawn by turtle.circle (the same
+    computation as in the standard turtle module).
+    """
+    w = extent / steps
+    w2 = 0.5 * w
+    length = 2.0 * radius * math.sin(w2)
+    if radius < 0:
+        length, w, w2 = -length, -w, -w2
+    direction += w2
+    points = [(x, y)]
+    for _ in range(steps):
+        x += length * math.cos(direction)
+        y += length * math.sin(direction)
+        points.append((x, y))
+        direction += w
+    return points
+
+
+def arc_centre(x: float, y: float, direction: float,
+               radius: float) -> Point:
+    """Returns centre of the circle drawn from the given turtle state."""
+    return x - radius * math.sin(direction), y + radius * math.cos(direction)
+
+
+def end_state(log: CommandLog, i: int) -> Tuple[float, float, float]:
+    """Returns (x, y, dir) of the turtle after the i-th record."""
+    x, y, direction = log.x[i], log.y[i], log.dir[i]
+    op = log.op[i]
+    if op == OP_FD:
+        return (x + log.a0[i] * math.cos(direction),
+                y + log.a0[i] * math.sin(direction), direction)
+    if op == OP_GOTO:
+        return log.a0[i], log.a1[i], direction
+    if op == OP_HOME:
+        return 0.0, 0.0, 0.0
+    if op == OP_CIRCLE:
+        radius, extent = log.a0[i], log.a1[i]
+        x, y = arc_points(x, y, direction, radius, extent, int(log.a2[i]))[-1]
+        return x, y, direction + (extent if radius >= 0 else -extent)
+    return x, y, direction
+
+
+def iter_paths(log: CommandLog) -> Iterator[List[Point]]:
+    """Yields polylines drawn with the pen down (one for each record)."""
+    cos, sin = math.cos, math.sin
+    for x, y, direction, a0, a1, a2, op, pen in zip(*log.columns()):
+        if not pen:
+            continue
+        if op == OP_FD:
+            yield [(x, y), (x + a0 * cos(direction), y + a0 * sin(direction))]
+        elif op == OP_GOTO:
+            yield [(x, y), (a0, a1)]
+        elif op == OP_HOME:
+            yield [(x, y), (0.0, 0.0)]
+        elif op == OP_CIRCLE:
+            yield arc_points(x, y, direction, a0, a1, int(a2))
+
+
+def iter_segments(log: CommandLog) -> Iterator[Segment]:
+    """Yields (x0, y0, x1, y1) of every line drawn with the pen down."""
+    for path in iter_paths(log):
+        for (x0, y0), (x1, y1) in zip(path, path[1:]):
+            yield x0, y0, x1, y1
+
+
+def iter_dots(log: CommandLog) -> Iterator[Tuple[float, float, float]]:
+    """Yields (x, y, diameter) of every dot."""
+    for x, y, size, op in zip(log.x, log.y, log.a0, log.op):
+        if op == OP_DOT:
+            yield x, y, size
+
+
+def stamp_polygon(x: float, y: float, direction: float,
+                  shape: Sequence[Point] = CLASSIC_SHAPE) -> List[Point]:
+    """Returns the turtle shape placed at the turtle position and heading."""
+    e0, e1 = math.cos(direction), math.sin(direction)
+    return [(x + e1 * sx + e0 * sy, y - e0 * sx + e1 * sy)
+            for sx, sy in shape]
+
+
+def iter_stamps(log: CommandLog) -> Iterator[List[Point]]:
+    """Yields polygons of every stamp."""
+    for x, y, direction, op in zip(log.x, log.y, log.dir, log.op):
+        if op == OP_STAMP:
+            yield stamp_polygon(x, y, direction)
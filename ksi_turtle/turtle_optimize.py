@@ -0,0 +1,123 @@
+"""
+Optimizer of the sandbox command log, run before the evaluator.
+
+Every record carries the absolute turtle state, so records can be merged
+or dropped without affecting the others:
+ * consecutive collinear pen-down forward moves are merged into one,
+ * chains of pen-up moves are collapsed into a single jump,
+ * pen-down moves retracing an already drawn segment are dropped.
+The drawing stays the same, only the number of records decreases.
+
+Usage:
+    python3 -m ksi_turtle.turtle_optimize INPUT_LOG OUTPUT_LOG
+"""
+
+import argparse
+import math
+from typing import NamedTuple, Optional, Set, Tuple
+
+from .turtle_log import (OP_CIRCLE, OP_DOT, OP_FD, OP_GOTO, OP_STAMP,
+                         CommandLog, end_state, read_log, write_log)
+
+# positions closer than this are considered the same
+EPSILON = 1e-9
+
+
+class OptimizeStats(NamedTuple):
+    records_before: int
+    records_after: int
+    merged: int
+    collapsed: int
+    duplicates: int
+
+    def ratio(self) -> float:
+        """Size of the optimized log relative to the original one."""
+        if self.records_before == 0:
+            return 1.0
+        return self.records_after / self.records_before
+
+
+def _segment_key(x0: float, y0: float, x1: float, y1: float) -> Tuple:
+    a = (round(x0 / EPSILON), round(y0 / EPSILON))
+    b = (round(x1 / EPSILON), round(y1 / EPSILON))
+    return (a, b) if a <= b else (b, a)
+
+
+def _append(log: CommandLog, x: float, y: float, direction: float,
+            a0: float, a1: float, a2: float, op: int, pen: int) -> None:
+    for column, value in zip(log.columns(),
+                             (x, y, direction, a0, a1, a2, op, pen)):
+        column.append(value)
+
+
+def optimize_log(log: CommandLog) -> Tuple[CommandLog, OptimizeStats]:
+    """Returns the optimized copy of the log and statistics."""
+    result = CommandLog()
+    merged = collapsed = duplicates = 0
+    drawn: Set[Tuple] = set()
+    # start and end state of the pending chain of pen-up moves
+    jump: Optional[Tuple[float, float, float, float, float]] = None
+    last = len(log) - 1
+
+    for i, (x, y, direction, a0, a1, a2, op, pen) in \
+            enumerate(zip(*log.columns())):
+        is_move = op not in (OP_CIRCLE, OP_DOT, OP_STAMP)
+
+        if is_move and not pen:
+            x1, y1, direction1 = end_state(log, i)
+            if jump is not None:
+                collapsed += 1
+                x, y = jump[0], jump[1]
+            jump = (x, y, x1, y1, direction1)
+            continue
+        if jump is not None:
+            jx, jy, jx1, jy1, jdirection = jump
+            _append(result, jx, jy, jdirection, jx1, jy1, 0.0, OP_GOTO, 0)
+            jump = None
+
+        if not is_move:
+            _append(result, x, y, direction, a0, a1, a2, op, pen)
+            continue
+
+        x1, y1, _ = end_state(log, i)
+        key = _segment_key(x, y, x1, y1)
+        if key in drawn and i != last:
+            duplicates += 1
+            continue
+        drawn.add(key)
+
+        n = len(result) - 1
+        if (op == OP_FD and n >= 0 and result.op[n] == OP_FD
+                and result.pen[n] and result.dir[n] == direction
+                and (result.a0[n] >= 0) == (a0 >= 0)):
+            px, py, _ = end_state(result, n)
+            if math.hypot(px - x, py - y) <= EPSILON:
+                result.a0[n] += a0
+                merged += 1
+                continue
+
+        _append(result, x, y, direction, a0, a1, a2, op, pen)
+
+    if jump is not None:
+        jx, jy, jx1, jy1, jdirection = jump
+        _append(result, jx, jy, jdirection, jx1, jy1, 0.0, OP_GOTO, 0)
+
+    return result, OptimizeStats(len(log), len(result), merged, collapsed,
+                                 duplicates)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('input_log')
+    parser.add_argument('output_log')
+    args = parser.parse_args(argv)
+    optimized, stats = optimize_log(read_log(args.input_log))
+    write_log(optimized, args.output_log)
+    print(f'{stats.records_before} -> {stats.records_after} records '
+          f'({stats.ratio():.1%}): {stats.merged} merged, '
+          f'{stats.collapsed} pen-up moves collapsed, '
+          f'{stats.duplicates} duplicates dropped')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+In-memory grading pipeline for turtle tasks.
+
+The reference (black for comparing, coloured for the feedback) is rendered
+once into memory, every student log is rendered, compared and combined with
+the reference without any EPS/PNG round-trips through the disk. Only the
+final feedback image is written.
+"""
+
+from typing import Callable, List, NamedTuple, Optional, Union
+
+from PIL import Image, ImageOps
+
+from .turtle_cache import REFERENCE_PEN_WIDTH
+from .turtle_compare import MAX_DIFFERENCE, MIN_ALPHA_DELTA, alpha_difference
+from .turtle_log import CommandLog, read_log
+from .turtle_raster import render
+from .turtle_vector import record_drawing
+
+SOLUTION_COLOR = '#cc2233'
+
+
+class Grading(NamedTuple):
+    difference: int
+    ok: bool
+
+
+class GradingPipeline:
+    """Keeps rendered reference buffers, grades student command logs."""
+
+    def __init__(self, solution: Union[str, List, CommandLog, Callable],
+                 pen_width: int = REFERENCE_PEN_WIDTH,
+                 solution_color: str = SOLUTION_COLOR,
+                 max_difference: int = MAX_DIFFERENCE) -> None:
+        if callable(solution):
+            solution = record_drawing(solution)
+        elif not isinstance(solution, CommandLog):
+            solution = read_log(solution)
+        self.pen_width = pen_width
+        self.max_difference = max_difference
+        self.solution = render(solution, pen_width)
+        self.solution_color = render(solution, pen_width, solution_color)
+
+    def render_student(self, student: Union[str, List, CommandLog]
+                       ) -> Image.Image:
+        return render(student, self.pen_width)
+
+    def overlay(self, student: Image.Image) -> Image.Image:
+        """
+        Returns the coloured reference with the student's drawing on top
+        (the same result as turtle_eval.combine_images).
+        """
+        result = self.solution_color.copy()
+        result.paste(student.convert('RGB'), (0, 0), ImageOps.invert(student))
+        return result
+
+    def grade(self, student: Union[str, List, CommandLog],
+              output: Optional[str] = None) -> Grading:
+        """
+        Grades the student's command log. If 'output' is given, the feedback
+        image is written there (format given by its extension).
+        """
+        image = self.render_student(student)
+        difference = alpha_difference(image, self.solution, MIN_ALPHA_DELTA)
+        if output is not None:
+            self.overlay(image).save(output)
+        return Grading(difference, difference <= self.max_difference)
@@ -0,0 +1,81 @@
+"""
+Headless rasterizer of the sandbox command log.
+Draws the records straight into an in-memory Pillow image, so no Tk,
+EPS export or Ghostscript is needed.
+
+The viewport is the same as the one exported by store_current_image
+(1150x700 canvas units centred at the turtle origin). The result is
+a white image with the drawing in black (mode "L") or in the given colour
+(mode "RGB"), i.e. its last band is what load_alpha returns for EPS.
+"""
+
+from typing import Iterable, List, Optional, Tuple, Union
+
+from PIL import Image, ImageDraw
+
+from .turtle_log import (CommandLog, Point, iter_dots, iter_paths, iter_stamps,
+                         read_log)
+
+WIDTH = 1150
+HEIGHT = 700
+PEN_WIDTH = 1
+
+
+def to_pixel(x: float, y: float, size: Tuple[int, int] = (WIDTH, HEIGHT)
+             ) -> Tuple[float, float]:
+    """Converts turtle coordinates to image pixel coordinates."""
+    return x + size[0] / 2, size[1] / 2 - y
+
+
+def draw_paths(draw: ImageDraw.ImageDraw, paths: Iterable[List[Point]],
+               ink, pen_width: int = PEN_WIDTH,
+               size: Tuple[int, int] = (WIDTH, HEIGHT)) -> None:
+    """Draws the polylines with round joints and caps (like Tk does)."""
+    radius = pen_width / 2
+    for path in paths:
+        pixels = [to_pixel(x, y, size) for x, y in path]
+        draw.line(pixels, fill=ink, width=pen_width, joint="curve")
+        if pen_width > 2:
+            for px, py in (pixels[0], pixels[-1]):
+                draw.ellipse((px - radius, py - radius,
+                              px + radius, py + radius), fill=ink)
+
+
+def draw_dots(draw: ImageDraw.ImageDraw,
+              dots: Iterable[Tuple[float, float, float]], ink,
+              size: Tuple[int, int] = (WIDTH, HEIGHT)) -> None:
+    for x, y, diameter in dots:
+        px, py = to_pixel(x, y, size)
+        radius = diameter / 2
+        draw.ellipse((px - radius, py - radius, px + radius, py + radius),
+                     fill=ink)
+
+
+def draw_stamps(draw: ImageDraw.ImageDraw, stamps: Iterable[List[Point]],
+                ink, size: Tuple[int, int] = (WIDTH, HEIGHT)) -> None:
+    for polygon in stamps:
+        draw.polygon([to_pixel(x, y, size) for x, y in polygon],
+                     fill=ink, outline=ink)
+
+
+def render(file: Union[str, List, CommandLog],
+           pen_width: int = PEN_WIDTH, color: Optional[str] = None,
+           size: Tuple[int, int] = (WIDTH, HEIGHT)) -> Image.Image:
+    """
+    Renders the command log (anything turtle_log.read_log accepts or
+    a CommandLog) into a new image.
+    """
+    log = file if isinstance(file, CommandLog) else read_log(file)
+
+    if color is None:
+        image = Image.new("L", size, 255)
+        ink = 0
+    else:
+        image = Image.new("RGB", size, "white")
+        ink = color
+
+    draw = ImageDraw.Draw(image)
+    draw_paths(draw, iter_paths(log), ink, pen_width, size)
+    draw_dots(draw, iter_dots(log), ink, size)
+    draw_stamps(draw, iter_stamps(log), ink, size)
+    return image
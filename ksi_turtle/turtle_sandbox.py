@@ -2,11 +2,194 @@
 # -*- coding: utf-8 -*-
 import sys
 import math
+import struct as KSI_struct_8kl
+from array import array as KSI_array_8kl
 from copy import deepcopy
 
-KSI_TURTLE_8kl = []
+# opcodes and pen codes of the binary log, keep in sync with turtle_log.py
+KSI_OPCODES_8kl = ("fd", "goto", "home", "circle", "dot", "stamp")
+(KSI_OP_FD_8kl, KSI_OP_GOTO_8kl, KSI_OP_HOME_8kl,
+ KSI_OP_CIRCLE_8kl, KSI_OP_DOT_8kl, KSI_OP_STAMP_8kl) = range(6)
+KSI_PENS_8kl = ("u", "d")
+KSI_MAGIC_8kl = b"KSI8kl\x00\x02"
+# pensize of the reference drawing (turtle_eval.store_image)
+KSI_PENSIZE_8kl = 3
+
+
+class KSI_BudgetExceeded_8kl(Exception):
+    """Raised when the turtle exceeds the limits set by KSI_STREAM_8kl."""
+
+
+class KSI_Log_8kl:
+    """Array-backed command log.
+    One float64 column for each of x, y, dir and the three command arguments,
+    uint8 columns for the opcode and the pen. Iterating yields the records
+    as tuples (x, y, dir, pen, command, *args) of the text format.
+
+    In the streaming mode (see KSI_STREAM_8kl) the columns hold only
+    the records not yet written to the output file.
+    """
+    __slots__ = ("x", "y", "dir", "a0", "a1", "a2", "op", "pen",
+                 "watched", "stream", "binary", "chunk_size",
+                 "count", "path_length", "max_commands", "max_path_length")
+    NARGS = (1, 2, 0, 3, 1, 0)
+
+    def __init__(self):
+        self.clear()
+        self.watched = False
+        self.stream = None
+        self.binary = False
+        self.chunk_size = 0
+        self.count = 0
+        self.path_length = 0.0
+        self.max_commands = None
+        self.max_path_length = None
+
+    def clear(self):
+        self.x = KSI_array_8kl("d")
+        self.y = KSI_array_8kl("d")
+        self.dir = KSI_array_8kl("d")
+        self.a0 = KSI_array_8kl("d")
+        self.a1 = KSI_array_8kl("d")
+        self.a2 = KSI_array_8kl("d")
+        self.op = KSI_array_8kl("B")
+        self.pen = KSI_array_8kl("B")
+
+    def record(self, x, y, dir, pen, op, a0=0.0, a1=0.0, a2=0.0):
+        if self.watched:
+            self.watch(x, y, op, a0, a1, a2)
+        self.x.append(x)
+        self.y.append(y)
+        self.dir.append(dir)
+        self.a0.append(a0)
+        self.a1.append(a1)
+        self.a2.append(a2)
+        self.op.append(op)
+        self.pen.append(pen == "d")
+
+    def watch(self, x, y, op, a0, a1, a2):
+        """Checks the budget and flushes a full chunk into the stream."""
+        self.charge(x, y, op, a0, a1, a2)
+        if self.stream is not None and len(self) >= self.chunk_size:
+            self.flush()
+
+    def charge(self, x, y, op, a0, a1, a2):
+        """Counts the record into the budget, raises if it is exceeded."""
+        if self.max_commands is not None and self.count >= self.max_commands:
+            raise KSI_BudgetExceeded_8kl(
+                f"Želva provedla příliš mnoho příkazů "
+                f"(limit {self.max_commands})."
+            )
+        if op == KSI_OP_FD_8kl:
+            length = abs(a0)
+        elif op == KSI_OP_GOTO_8kl:
+            length = math.hypot(a0 - x, a1 - y)
+        elif op == KSI_OP_HOME_8kl:
+            length = math.hypot(x, y)
+        elif op == KSI_OP_CIRCLE_8kl:
+            length = abs(2.0 * a0 * math.sin(0.5 * a1 / a2)) * a2
+        else:
+            length = 0.0
+        if (self.max_path_length is not None
+                and self.path_length + length > self.max_path_length):
+            raise KSI_BudgetExceeded_8kl(
+                f"Želva urazila příliš dlouhou dráhu "
+                f"(limit {self.max_path_length})."
+            )
+        self.count += 1
+        self.path_length += length
+
+    def flush(self):
+        """Writes the buffered records into the stream."""
+        if self.binary:
+            self.write_binary(self.stream)
+        else:
+            self.stream.write("".join(
+                "\n" + " ".join(str(x) for x in t) for t in self
+            ))
+        self.stream.flush()
+        self.clear()
+
+    def append(self, t):
+        op = KSI_OPCODES_8kl.index(t[4])
+        self.record(t[0], t[1], t[2], t[3], op, *t[5:])
+
+    def __len__(self):
+        return len(self.op)
+
+    def __getitem__(self, i):
+        op = self.op[i]
+        args = (self.a0[i], self.a1[i], self.a2[i])[:self.NARGS[op]]
+        return (self.x[i], self.y[i], self.dir[i], KSI_PENS_8kl[self.pen[i]],
+                KSI_OPCODES_8kl[op], *args)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def columns(self):
+        return (self.x, self.y, self.dir, self.a0, self.a1, self.a2,
+                self.op, self.pen)
+
+    def write_binary(self, f):
+        """Writes one block: uint32 count and the little-endian columns."""
+        f.write(KSI_struct_8kl.pack("<I", len(self)))
+        for column in self.columns():
+            if sys.byteorder == "big" and column.itemsize > 1:
+                column = KSI_array_8kl(column.typecode, column)
+                column.byteswap()
+            column.tofile(f)
+
+
+KSI_TURTLE_8kl = KSI_Log_8kl()
+
+def KSI_STREAM_8kl(filename: str, max_commands: int = None,
+                   max_path_length: float = None, chunk_size: int = 65536,
+                   binary: bool = False) -> None:
+    """Streams the command log into the file in chunks of 'chunk_size'
+    records instead of keeping it in memory until KSI_WRITE_8kl.
+    Once the turtle would exceed 'max_commands' records or the total path
+    length 'max_path_length', KSI_BudgetExceeded_8kl is raised.
+    KSI_WRITE_8kl(filename) has to be called at the end to write the rest.
+    """
+    log = KSI_TURTLE_8kl
+    log.binary = binary
+    log.chunk_size = chunk_size
+    log.max_commands = max_commands
+    log.max_path_length = max_path_length
+    # records made before streaming started count into the budget too
+    for i in range(len(log)):
+        log.charge(log.x[i], log.y[i], log.op[i],
+                   log.a0[i], log.a1[i], log.a2[i])
+    log.watched = True
+    if binary:
+        log.stream = open(filename, "wb")
+        log.stream.write(KSI_MAGIC_8kl)
+    else:
+        log.stream = open(filename, "w")
+        log.stream.write("\n#KSI_META_OUTPUT_0a859a#")
+    log.flush()
+
+def KSI_WRITE_8kl(filename: str = None, binary: bool = False) -> str:
+    """Writes the command log to stdout or to the file.
+    With binary=True (only into a file) the compact binary format read by
+    turtle_log.read_log is used and an empty string is returned.
+    In the streaming mode, the rest of the log is written into the stream
+    opened by KSI_STREAM_8kl and an empty string is returned.
+    """
+    if KSI_TURTLE_8kl.stream is not None:
+        KSI_TURTLE_8kl.flush()
+        KSI_TURTLE_8kl.stream.close()
+        KSI_TURTLE_8kl.stream = None
+        KSI_TURTLE_8kl.watched = False
+        return ""
+
+    if binary and filename is not None:
+        with open(filename, "wb") as f:
+            f.write(KSI_MAGIC_8kl)
+            KSI_TURTLE_8kl.write_binary(f)
+        return ""
 
-def KSI_WRITE_8kl(filename: str = None) -> str:
     answer_list = ["\n#KSI_META_OUTPUT_0a859a#"]
     for t in KSI_TURTLE_8kl:
         answer_list.append((" ".join(str(x) for x in t)))
@@ -25,6 +208,8 @@ def KSI_WRITE_8kl(filename: str = None) -> str:
 def done():
     pass
 
+KSI_tuple_new_8kl = tuple.__new__
+
 ## taken from oficial source code
 class Vec2D(tuple):
     """A 2 dimensional vector class, used as a helper class
@@ -40,21 +225,23 @@ class Vec2D(tuple):
        |a| absolute value of a
        a.rotate(angle) rotation
     """
+    __slots__ = ()
+
     def __new__(cls, x, y):
-        return tuple.__new__(cls, (x, y))
+        return KSI_tuple_new_8kl(cls, (x, y))
     def __add__(self, other):
-        return Vec2D(self[0]+other[0], self[1]+other[1])
+        return KSI_tuple_new_8kl(Vec2D, (self[0]+other[0], self[1]+other[1]))
     def __mul__(self, other):
         if isinstance(other, Vec2D):
             return self[0]*other[0]+self[1]*other[1]
-        return Vec2D(self[0]*other, self[1]*other)
+        return KSI_tuple_new_8kl(Vec2D, (self[0]*other, self[1]*other))
     def __rmul__(self, other):
         if isinstance(other, int) or isinstance(other, float):
-            return Vec2D(self[0]*other, self[1]*other)
+            return KSI_tuple_new_8kl(Vec2D, (self[0]*other, self[1]*other))
     def __sub__(self, other):
-        return Vec2D(self[0]-other[0], self[1]-other[1])
+        return KSI_tuple_new_8kl(Vec2D, (self[0]-other[0], self[1]-other[1]))
     def __neg__(self):
-        return Vec2D(-self[0], -self[1])
+        return KSI_tuple_new_8kl(Vec2D, (-self[0], -self[1]))
     def __abs__(self):
         return (self[0]**2 + self[1]**2)**0.5
     def rotate(self, angle):
@@ -71,6 +258,11 @@ class Vec2D(tuple):
 
 
 class Turtle:
+    # heading is kept together with its unit vector (_cos, _sin),
+    # which is recomputed only when the heading changes
+    __slots__ = ("x", "y", "_dir", "_cos", "_sin", "units", "mode", "pen",
+                 "_pensize", "__dict__")
+
     def __init__(self):
         self.x = 0
         self.y = 0
@@ -78,6 +270,17 @@ class Turtle:
         self.units = "d"
         self.mode = "s"
         self.pen = "d"
+        self._pensize = KSI_PENSIZE_8kl
+
+    @property
+    def dir(self):
+        return self._dir
+
+    @dir.setter
+    def dir(self, value):
+        self._dir = value
+        self._cos = math.cos(value)
+        self._sin = math.sin(value)
 
     def to_radians(self, unit):
         if self.units == "d":
@@ -100,18 +303,23 @@ class Turtle:
         return angle + math.radians(90)
 
     def forward(self, step):
-        new_x = self.x + step * math.cos(self.dir)
-        new_y = self.y + step * math.sin(self.dir)
-        KSI_TURTLE_8kl.append((self.x, self.y, self.dir, self.pen, "fd", step))
-        self.x = new_x
-        self.y = new_y
+        x = self.x
+        y = self.y
+        KSI_TURTLE_8kl.record(x, y, self._dir, self.pen, KSI_OP_FD_8kl, step)
+        self.x = x + step * self._cos
+        self.y = y + step * self._sin
 
     def back(self, distance):
         self.forward(-distance)
 
     def right(self, angle):
         # KSI_TURTLE_8kl.append((self.x, self.y, self.dir, self.pen, "rt", self.to_degrees(angle)))
-        self.dir -= self.to_radians(angle)
+        if self.units == "d":
+            angle = math.radians(angle)
+        direction = self._dir - angle
+        self._dir = direction
+        self._cos = math.cos(direction)
+        self._sin = math.sin(direction)
 
     def left(self, angle):
         self.right(-angle)
@@ -123,7 +331,7 @@ class Turtle:
         else:
             new_x = x
             new_y = y
-        KSI_TURTLE_8kl.append((self.x, self.y, self.dir, self.pen, "goto", new_x, new_y))
+        KSI_TURTLE_8kl.record(self.x, self.y, self.dir, self.pen, KSI_OP_GOTO_8kl, new_x, new_y)
         self.x = new_x
         self.y = new_y
 
@@ -138,7 +346,7 @@ class Turtle:
         self.dir = self.to_standard(self.to_radians(angle))
 
     def home(self):
-        KSI_TURTLE_8kl.append((self.x, self.y, self.dir, self.pen, "home"))
+        KSI_TURTLE_8kl.record(self.x, self.y, self.dir, self.pen, KSI_OP_HOME_8kl)
         self.x = self.y = 0
         if self.mode == "s":
             self.dir = 0
@@ -146,16 +354,36 @@ class Turtle:
             self.dir = 90
 
     def circle(self, radius, extent=None, steps=None):
-        # ToDo
-        pass
+        # recorded as a single arc, the end state is computed from
+        # the same polygon the real turtle draws
+        if extent is None:
+            extent = 2 * math.pi
+        else:
+            extent = self.to_radians(extent)
+        if steps is None:
+            frac = abs(extent) / (2 * math.pi)
+            steps = 1 + int(min(11 + abs(radius) / 6.0, 59.0) * frac)
+        KSI_TURTLE_8kl.record(self.x, self.y, self.dir, self.pen, KSI_OP_CIRCLE_8kl, radius, extent, steps)
+        w = extent / steps
+        w2 = 0.5 * w
+        l = 2.0 * radius * math.sin(w2)
+        if radius < 0:
+            l, w, w2 = -l, -w, -w2
+        direction = self.dir + w2
+        for _ in range(steps):
+            self.x += l * math.cos(direction)
+            self.y += l * math.sin(direction)
+            direction += w
+        self.dir = direction - w2
 
     def dot(self, size=None, *color):
-        # ToDo
-        pass
+        if size is None:
+            # the default of turtle.dot
+            size = max(self._pensize + 4, 2 * self._pensize)
+        KSI_TURTLE_8kl.record(self.x, self.y, self.dir, self.pen, KSI_OP_DOT_8kl, size)
 
     def stamp(self):
-        # ToDo
-        pass
+        KSI_TURTLE_8kl.record(self.x, self.y, self.dir, self.pen, KSI_OP_STAMP_8kl)
 
     def clearstamp(self, stamp_id):
         # ToDo
@@ -223,18 +451,29 @@ class Turtle:
         self.pen = "u" 
 
     def pensize(self, width=None):
-        # ToDo
-        pass
-
-    def pen(self, pen=None, **pendict):
-        # ToDo
-        pass
+        # only the size of dots depends on it, lines are drawn by the evaluator
+        if width is None:
+            return self._pensize
+        self._pensize = width
 
     def isdown(self):
         return self.pen == "d"
     
     def clone(self):
-        return deepcopy(self)
+        other = object.__new__(type(self))
+        other.x = self.x
+        other.y = self.y
+        other._dir = self._dir
+        other._cos = self._cos
+        other._sin = self._sin
+        other.units = self.units
+        other.mode = self.mode
+        other.pen = self.pen
+        other._pensize = self._pensize
+        if self.__dict__:
+            # attributes added by a subclass
+            other.__dict__.update(deepcopy(self.__dict__))
+        return other
 
     def color(self, *args):
         # todo
@@ -0,0 +1,179 @@
+"""
+Comparison of turtle drawings in vector space, without rasterization.
+
+Both drawings are normalized (pen-up moves and zero-length segments dropped,
+collinear overlapping segments merged) and every segment is sampled; a sample
+is matched when it is within 'tolerance' of a segment of the other drawing.
+Segments are looked up in a uniform grid, so the comparison is roughly
+linear in the total length of the drawings.
+"""
+
+import math
+from collections import defaultdict
+from typing import (Callable, Dict, Iterable, List, NamedTuple, Set, Tuple,
+                    Union)
+
+from .turtle_log import CommandLog, Segment, iter_segments, read_log
+
+TOLERANCE = 2.0
+# segments closer than this (in units or radians) are considered collinear
+LINE_EPSILON = 1e-6
+
+
+class VectorDiff(NamedTuple):
+    """Pieces of the reference not drawn by the student and vice versa."""
+    missing: List[Segment]
+    extra: List[Segment]
+
+    def missing_length(self) -> float:
+        return sum(_length(segment) for segment in self.missing)
+
+    def extra_length(self) -> float:
+        return sum(_length(segment) for segment in self.extra)
+
+    def same(self, max_length: float = 0.0) -> bool:
+        """True if at most 'max_length' is missing and extra altogether."""
+        return self.missing_length() + self.extra_length() <= max_length
+
+
+def _length(segment: Segment) -> float:
+    x0, y0, x1, y1 = segment
+    return math.hypot(x1 - x0, y1 - y0)
+
+
+def normalize(segments: Iterable[Segment],
+              epsilon: float = LINE_EPSILON) -> List[Segment]:
+    """Drops zero-length segments and merges collinear overlapping ones."""
+    lines: Dict[Tuple[int, int], List[Tuple[float, float, float, float]]] = \
+        defaultdict(list)
+    for segment in segments:
+        x0, y0, x1, y1 = segment
+        if _length(segment) <= epsilon:
+            continue
+        angle = math.atan2(y1 - y0, x1 - x0) % math.pi
+        if math.pi - angle <= epsilon:
+            angle = 0.0
+        ux, uy = math.cos(angle), math.sin(angle)
+        offset = ux * y0 - uy * x0
+        t0, t1 = sorted((ux * x0 + uy * y0, ux * x1 + uy * y1))
+        key = (round(angle / epsilon), round(offset / epsilon))
+        lines[key].append((t0, t1, angle, offset))
+
+    result = []
+    for intervals in lines.values():
+        intervals.sort()
+        _, _, angle, offset = intervals[0]
+        ux, uy = math.cos(angle), math.sin(angle)
+        start, end = intervals[0][:2]
+        for t0, t1, _, _ in intervals[1:] + [(math.inf, math.inf, 0, 0)]:
+            if t0 <= end + epsilon:
+                end = max(end, t1)
+                continue
+            result.append((-uy * offset + ux * start, ux * offset + uy * start,
+                           -uy * offset + ux * end, ux * offset + uy * end))
+            start, end = t0, t1
+    return result
+
+
+class SegmentGrid:
+    """Uniform grid answering 'is a point within tolerance of a segment'."""
+
+    def __init__(self, segments: List[Segment], tolerance: float) -> None:
+        self.segments = segments
+        self.tolerance = tolerance
+        self.cell = max(2 * tolerance, 1.0)
+        self.cells: Dict[Tuple[int, int], Set[int]] = defaultdict(set)
+        step = self.cell / 2
+        for i, segment in enumerate(segments):
+            for x, y in _samples(segment, step):
+                cx, cy = self._cell(x, y)
+                for dx in (-1, 0, 1):
+                    for dy in (-1, 0, 1):
+                        self.cells[(cx + dx, cy + dy)].add(i)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x / self.cell), math.floor(y / self.cell)
+
+    def covers(self, x: float, y: float) -> bool:
+        for i in self.cells.get(self._cell(x, y), ()):
+            if _distance(x, y, self.segments[i]) <= self.tolerance:
+                return True
+        return False
+
+
+def _samples(segment: Segment, step: float) -> List[Tuple[float, float]]:
+    x0, y0, x1, y1 = segment
+    n = max(1, math.ceil(_length(segment) / step))
+    return [(x0 + (x1 - x0) * i / n, y0 + (y1 - y0) * i / n)
+            for i in range(n + 1)]
+
+
+def _distance(x: float, y: float, segment: Segment) -> float:
+    x0, y0, x1, y1 = segment
+    dx, dy = x1 - x0, y1 - y0
+    length2 = dx * dx + dy * dy
+    t = 0.0 if length2 == 0 else \
+        max(0.0, min(1.0, ((x - x0) * dx + (y - y0) * dy) / length2))
+    return math.hypot(x - x0 - t * dx, y - y0 - t * dy)
+
+
+def uncovered(segments: List[Segment], grid: SegmentGrid) -> List[Segment]:
+    """Returns pieces of the segments not covered by the grid."""
+    step = max(grid.tolerance, 0.5)
+    pieces = []
+    for segment in segments:
+        x0, y0, x1, y1 = segment
+        samples = _samples(segment, step)
+        n = len(samples) - 1
+        covered = [grid.covers(x, y) for x, y in samples] + [True]
+        run_start = None
+        for i, is_covered in enumerate(covered):
+            if not is_covered:
+                if run_start is None:
+                    run_start = i
+            elif run_start is not None:
+                t0 = max(0.0, (run_start - 0.5) / n)
+                t1 = min(1.0, (i - 0.5) / n)
+                pieces.append((x0 + (x1 - x0) * t0, y0 + (y1 - y0) * t0,
+                               x0 + (x1 - x0) * t1, y0 + (y1 - y0) * t1))
+                run_start = None
+    return pieces
+
+
+def compare_segments(student: Iterable[Segment], solution: Iterable[Segment],
+                     tolerance: float = TOLERANCE) -> VectorDiff:
+    student_segments = normalize(student)
+    solution_segments = normalize(solution)
+    return VectorDiff(
+        missing=uncovered(solution_segments,
+                          SegmentGrid(student_segments, tolerance)),
+        extra=uncovered(student_segments,
+                        SegmentGrid(solution_segments, tolerance)),
+    )
+
+
+def compare_logs(student: Union[str, List, CommandLog],
+                 solution: Union[str, List, CommandLog],
+                 tolerance: float = TOLERANCE) -> VectorDiff:
+    """Compares two command logs (anything turtle_log.read_log accepts)."""
+    logs = [log if isinstance(log, CommandLog) else read_log(log)
+            for log in (student, solution)]
+    return compare_segments(iter_segments(logs[0]), iter_segments(logs[1]),
+                            tolerance)
+
+
+def record_drawing(drawing_function: Callable) -> CommandLog:
+    """
+    Runs the teacher's drawing function with the sandbox turtle and returns
+    its command log (to be used as the solution of compare_logs).
+    """
+    from . import turtle_sandbox
+
+    recorded = turtle_sandbox.KSI_TURTLE_8kl
+    recorded.clear()
+    drawing_function(turtle_sandbox.Turtle())
+    log = CommandLog()
+    for column, values in zip(log.columns(), recorded.columns()):
+        column.extend(values)
+    recorded.clear()
+    return log
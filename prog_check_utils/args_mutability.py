@@ -1,7 +1,8 @@
 """Check im/mutability of function args"""
 
+import copy
 import inspect
-from typing import Dict, Callable, Any, Optional, List
+from typing import Dict, Callable, Any, Optional, List, Tuple
 from collections.abc import MutableSequence, MutableSet, MutableMapping
 
 
@@ -43,3 +44,93 @@ def assert_immutable_arg_default_values(
     assert not is_mutable_arg_default_value(func, user_mutable_types), \
         (f"Funkce '{func.__name__}' obsahuje *mutable* výchozí hodnotu "
          "argumentu!")
+
+
+# Types whose values cannot change, compared directly.
+_ATOMIC_TYPES = frozenset({
+    int, float, complex, bool, str, bytes, type(None), range, type(Ellipsis),
+})
+
+
+def _is_value(obj: Any) -> bool:
+    """True for atomic values and tuples of them, which can be kept as is."""
+    cls = type(obj)
+    return cls in _ATOMIC_TYPES or (
+        cls is tuple and all(_is_value(item) for item in obj))
+
+
+def _freeze(obj: Any, memo: Dict[int, int]) -> Any:
+    # memo holds the containers being frozen (id -> depth), i.e. only cycles
+    # are recorded as references, shared objects are frozen by value
+    cls = type(obj)
+    if cls in _ATOMIC_TYPES:
+        return obj
+    if id(obj) in memo:
+        return ('ref', memo[id(obj)])
+    if cls is list or cls is tuple or cls is dict:
+        if cls is dict and not all(_is_value(key) for key in obj):
+            return (object, copy.deepcopy(obj))
+        memo[id(obj)] = len(memo)
+        try:
+            if cls is dict:
+                return (dict, {key: _freeze(value, memo)
+                               for key, value in obj.items()})
+            return (cls, tuple(_freeze(item, memo) for item in obj))
+        finally:
+            del memo[id(obj)]
+    if (cls is set or cls is frozenset) and all(_is_value(item)
+                                                for item in obj):
+        return (cls, frozenset(obj))
+    if cls is bytearray:
+        return (bytearray, bytes(obj))
+    return (object, copy.deepcopy(obj))
+
+
+def _matches(obj: Any, frozen: Any, memo: Dict[int, int]) -> bool:
+    cls = type(obj)
+    if cls in _ATOMIC_TYPES:
+        return obj is frozen or obj == frozen
+    if not isinstance(frozen, tuple) or len(frozen) != 2:
+        return False
+    if id(obj) in memo:
+        return frozen == ('ref', memo[id(obj)])
+    kind, content = frozen
+    if kind is object:
+        return obj == content
+    if cls is list or cls is tuple or cls is dict:
+        if kind is not cls or len(obj) != len(content):
+            return False
+        memo[id(obj)] = len(memo)
+        try:
+            if cls is dict:
+                return all(key in content
+                           and _matches(value, content[key], memo)
+                           for key, value in obj.items())
+            return all(_matches(item, frozen_item, memo)
+                       for item, frozen_item in zip(obj, content))
+        finally:
+            del memo[id(obj)]
+    return kind is cls and obj == content
+
+
+class ArgsSnapshot:
+    """
+    Snapshot of function arguments for detecting their modification.
+
+    Built-in containers (list, tuple, dict, set, ...) and atomic values
+    are captured structurally in a single traversal, deepcopy is used only
+    for other types (and for sets and dict keys that are not atomic).
+    Shared objects are compared by value, as with deepcopy and ==.
+    Comparison walks the arguments and the snapshot together without
+    copying anything.
+    """
+
+    __slots__ = ('frozen',)
+
+    def __init__(self, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> None:
+        self.frozen = _freeze((args, kwargs), {})
+
+    def unchanged(self, args: Tuple[Any, ...],
+                  kwargs: Dict[str, Any]) -> bool:
+        """Returns True if the arguments equal the snapshot."""
+        return _matches((args, kwargs), self.frozen, {})
@@ -0,0 +1,245 @@
+"""
+Concurrent evaluation: flake8, mypy and the functional tests at once.
+
+Usage:
+    def tests() -> bool:
+        student = wrap_student_module(filename, allowed_libs)
+        ...
+    result = evaluate(filename, tests, mypy_args=['--allow-any-expr'])
+
+flake8 and mypy run as subprocesses driven by an event loop in a helper
+thread, which reads their stdout and stderr while they run (capped at
+'output_limit' bytes, truncated outputs are not cached). Meanwhile the
+tests run in the calling thread, so signal based limits of utils.budget
+work in them when it is the main thread. The results are reported (the
+same messages as flake8_check/mypy_check) once all of them are done, so
+the evaluation takes as long as the slowest check.
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, List, NamedTuple, Optional, Tuple
+
+from utils.command_helpers import (MypyDaemon, command_output,
+                                   flake8_command, flake8_options,
+                                   flake8_report, mypy_command, mypy_options,
+                                   mypy_report, mypy_stdout,
+                                   strip_mypy_filename)
+from utils.result_cache import ResultCache
+
+DEFAULT_OUTPUT_LIMIT = 1024 * 1024
+TRUNCATED = '\n... (výstup byl zkrácen)'
+
+
+class EvaluationResult(NamedTuple):
+    flake8_ok: Optional[bool]
+    mypy_ok: Optional[bool]
+    tests_result: Any
+    tests_error: Optional[BaseException]
+
+    @property
+    def ok(self) -> bool:
+        return (self.flake8_ok is not False and self.mypy_ok is not False
+                and self.tests_error is None
+                and self.tests_result is not False)
+
+
+async def _read_capped(stream: asyncio.StreamReader,
+                       limit: int) -> Tuple[bytes, bool]:
+    """Reads the whole stream, keeps at most 'limit' bytes"""
+    chunks = []
+    size = 0
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            break
+        if size < limit:
+            chunks.append(chunk[:limit - size])
+        size += len(chunk)
+    return b''.join(chunks), size > limit
+
+
+def _decode(data: bytes, truncated: bool) -> str:
+    if truncated:
+        return data.decode('utf-8', errors='replace') + TRUNCATED
+    return data.decode('utf-8')
+
+
+async def _spawn(cmd: List[str]) -> asyncio.subprocess.Process:
+    return await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+
+
+async def _collect(process: asyncio.subprocess.Process, cmd: List[str],
+                   output_limit: int) -> Tuple[str, bool]:
+    """
+    Returns stdout of the process and whether it was not truncated.
+    The process is killed (and reaped) if the reading is cancelled.
+    """
+    assert process.stdout is not None and process.stderr is not None
+    try:
+        (stdout, stdout_cut), (stderr, stderr_cut) = await asyncio.gather(
+            _read_capped(process.stdout, output_limit),
+            _read_capped(process.stderr, output_limit),
+        )
+        await process.wait()
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    output = command_output(cmd, _decode(stdout, stdout_cut),
+                            _decode(stderr, stderr_cut))
+    return output, not stdout_cut
+
+
+async def execute_command_async(
+        cmd: List[str], output_limit: int = DEFAULT_OUTPUT_LIMIT) -> str:
+    """Executes any command and returns stdout (as _execute_command)"""
+    output, _ = await _collect(await _spawn(cmd), cmd, output_limit)
+    return output
+
+
+async def _tool_output(cache: Optional[ResultCache], tool: str,
+                       options: List[str], filename: str, cmd: List[str],
+                       output_limit: int,
+                       postprocess: Callable[[str], str] = str) -> str:
+    """
+    Returns the (postprocessed) output of the tool from the cache or runs
+    the tool; its output is stored in the cache unless it was truncated.
+    """
+    key = None
+    if cache is not None:
+        key = cache.key(tool, options, filename)
+        output = cache.get(tool, key)
+        if output is not None:
+            return output
+    output, complete = await _collect(await _spawn(cmd), cmd, output_limit)
+    output = postprocess(output)
+    if cache is not None and key is not None and complete:
+        cache.put(key, output)
+    return output
+
+
+async def flake8_stdout_async(
+        filename: str, cache: Optional[ResultCache] = None,
+        output_limit: int = DEFAULT_OUTPUT_LIMIT) -> str:
+    return await _tool_output(cache, 'flake8', flake8_options(), filename,
+                              flake8_command(filename), output_limit)
+
+
+async def mypy_stdout_async(filename: str, args: List[str],
+                            daemon: Optional[MypyDaemon] = None,
+                            cache: Optional[ResultCache] = None,
+                            output_limit: int = DEFAULT_OUTPUT_LIMIT) -> str:
+    if daemon is not None:
+        # the daemon client is synchronous
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, mypy_stdout, filename, args,
+                                          daemon, cache)
+    return await _tool_output(cache, 'mypy', mypy_options(args), filename,
+                              mypy_command(filename, args), output_limit,
+                              strip_mypy_filename)
+
+
+async def _value(value: Any) -> Any:
+    return value
+
+
+class _ToolsThread(threading.Thread):
+    """Runs a coroutine in its own event loop, see run_checks."""
+
+    def __init__(self, coro: Awaitable[Any]) -> None:
+        super().__init__(daemon=True)
+        self.coro = coro
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.started_loop = threading.Event()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.task: Optional[asyncio.Task[Any]] = None
+
+    def run(self) -> None:
+        try:
+            self.result = asyncio.run(self.main())
+        except BaseException as exc:  # pylint: disable=broad-except
+            self.error = exc
+        finally:
+            self.started_loop.set()
+
+    async def main(self) -> Any:
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self.started_loop.set()
+        return await self.coro
+
+    def cancel(self) -> None:
+        """Cancels the coroutine and waits until it is finished."""
+        self.started_loop.wait()
+        if self.loop is not None and self.task is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.task.cancel)
+            except RuntimeError:
+                pass  # the loop is already closed
+        self.join()
+
+
+async def run_checks(filename: str,
+                     tests: Optional[Callable[[], Any]] = None,
+                     flake8: bool = True,
+                     mypy: bool = True,
+                     mypy_args: Optional[List[str]] = None,
+                     daemon: Optional[MypyDaemon] = None,
+                     cache: Optional[ResultCache] = None,
+                     output_limit: int = DEFAULT_OUTPUT_LIMIT
+                     ) -> EvaluationResult:
+    """
+    Runs the enabled tools in a helper thread and the tests meanwhile, then
+    reports flake8 and mypy results. An exception of the tests is returned
+    in the result, failures of the tools themselves are raised (after all
+    checks finished). If the tests raise a BaseException (e.g.
+    KeyboardInterrupt), the tools are killed before it is propagated.
+    """
+    async def run_tools() -> Tuple[Any, Any]:
+        return await asyncio.gather(
+            flake8_stdout_async(filename, cache, output_limit) if flake8
+            else _value(None),
+            mypy_stdout_async(filename, mypy_args or [], daemon, cache,
+                              output_limit) if mypy else _value(None),
+            return_exceptions=True,
+        )
+
+    tools = _ToolsThread(run_tools())
+    tools.start()
+
+    tests_result = tests_error = None
+    try:
+        if tests is not None:
+            try:
+                tests_result = tests()
+            except Exception as exc:  # pylint: disable=broad-except
+                tests_error = exc
+    except BaseException:
+        tools.cancel()
+        raise
+
+    await asyncio.get_running_loop().run_in_executor(None, tools.join)
+    if tools.error is not None:
+        raise tools.error
+    flake8_output, mypy_output = tools.result
+    for output in (flake8_output, mypy_output):
+        if isinstance(output, BaseException):
+            raise output
+
+    return EvaluationResult(
+        flake8_report(flake8_output) if flake8 else None,
+        mypy_report(mypy_output) if mypy else None,
+        tests_result,
+        tests_error,
+    )
+
+
+def evaluate(filename: str, tests: Optional[Callable[[], Any]] = None,
+             **kwargs: Any) -> EvaluationResult:
+    """Synchronous entry point of run_checks"""
+    return asyncio.run(run_checks(filename, tests, **kwargs))
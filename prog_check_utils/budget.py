@@ -0,0 +1,124 @@
+"""
+Limits of CPU time, wall-clock time and memory for a single call of
+student code. Unix only, time limits work in the main thread only.
+
+Usage:
+    with BudgetLimiter(Budget(cpu_time=1.0, memory=2**28)):
+        run some code
+
+BudgetExceeded is raised when a limit is exceeded. It is a BaseException,
+so 'except Exception' in the student code does not swallow it.
+"""
+
+import resource
+import signal
+import threading
+import time
+from types import FrameType
+from typing import Any, NamedTuple, Optional
+
+
+class Budget(NamedTuple):
+    cpu_time: Optional[float] = None  # seconds
+    wall_time: Optional[float] = None  # seconds
+    memory: Optional[int] = None  # bytes above the current usage
+
+
+class BudgetExceeded(BaseException):
+    """Raised when a limit of the budget is exceeded, args[0] is the name
+    of the Budget field."""
+
+    @property
+    def limit(self) -> str:
+        return self.args[0]
+
+
+def address_space() -> Optional[int]:
+    """Current size of the virtual memory of the process (Linux only)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class BudgetLimiter:
+    """Context manager enforcing the budget, the previous timers, signal
+    handlers and the memory limit are restored at the exit."""
+
+    __slots__ = ('budget', 'active', 'start', 'orig_handlers', 'orig_timers',
+                 'orig_rlimit')
+
+    # timer and its signal for the Budget fields
+    TIMERS = (('cpu_time', signal.ITIMER_PROF, signal.SIGPROF),
+              ('wall_time', signal.ITIMER_REAL, signal.SIGALRM))
+
+    def __init__(self, budget: Budget) -> None:
+        self.budget = budget
+        self.active = False
+        # CPU and wall-clock time at the start
+        self.start = {signal.ITIMER_PROF: 0.0, signal.ITIMER_REAL: 0.0}
+        self.orig_handlers: Any = {}
+        self.orig_timers: Any = {}
+        self.orig_rlimit: Any = None
+
+    def _handler(self, limit: str) -> Any:
+        def handler(signum: int, frame: Optional[FrameType]) -> None:
+            if self.active:
+                raise BudgetExceeded(limit)
+        return handler
+
+    def __enter__(self) -> 'BudgetLimiter':
+        if (self.budget.cpu_time is not None
+                or self.budget.wall_time is not None) \
+                and threading.current_thread() is not threading.main_thread():
+            raise RuntimeError('time limits of a budget work in the main '
+                               'thread only')
+        if self.budget.memory is not None:
+            current = address_space()
+            if current is not None:
+                self.orig_rlimit = resource.getrlimit(resource.RLIMIT_AS)
+                soft, hard = self.orig_rlimit
+                limit = current + self.budget.memory
+                if hard != resource.RLIM_INFINITY:
+                    limit = min(limit, hard)
+                if soft == resource.RLIM_INFINITY or limit < soft:
+                    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+                else:
+                    self.orig_rlimit = None
+
+        self.active = True
+        self.start = {signal.ITIMER_PROF: time.process_time(),
+                      signal.ITIMER_REAL: time.monotonic()}
+        try:
+            for name, timer, signum in self.TIMERS:
+                seconds = getattr(self.budget, name)
+                if seconds is None:
+                    continue
+                self.orig_handlers[signum] = signal.signal(
+                    signum, self._handler(name))
+                self.orig_timers[timer] = signal.setitimer(timer, seconds)
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> None:
+        self.active = False
+        try:
+            for timer in self.orig_timers:
+                signal.setitimer(timer, 0)
+            for signum, handler in self.orig_handlers.items():
+                signal.signal(signum, handler)
+            now = {signal.ITIMER_PROF: time.process_time(),
+                   signal.ITIMER_REAL: time.monotonic()}
+            for timer, (delay, interval) in self.orig_timers.items():
+                if delay:
+                    # re-arm the outer timer, an expired one fires at once
+                    remaining = delay - (now[timer] - self.start[timer])
+                    signal.setitimer(timer, max(remaining, 1e-3), interval)
+        finally:
+            if self.orig_rlimit is not None:
+                resource.setrlimit(resource.RLIMIT_AS, self.orig_rlimit)
+        if exc_type is MemoryError and self.orig_rlimit is not None:
+            raise BudgetExceeded('memory') from exc
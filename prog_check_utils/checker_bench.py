@@ -0,0 +1,75 @@
+"""
+Benchmark of the per-call overhead of a wrapped student module.
+
+Usage (from the directory containing 'utils'):
+    python3 -m utils.checker_bench
+"""
+
+import os
+import tempfile
+import timeit
+from typing import Callable, Dict
+
+from utils.checker_helpers import wrap_student_module
+from utils.import_reporter import ImportGuard
+
+CALLS = 100_000
+
+STUDENT_CODE = '''
+def add(a, b):
+    return a + b
+'''
+
+
+def run(repeat: int = 5) -> Dict[str, float]:
+    """Returns nanoseconds per call of every benchmark (best of 'repeat')."""
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'student.py')
+        with open(filename, 'w') as f:
+            f.write(STUDENT_CODE)
+        student = wrap_student_module(filename, allowed_libs=[])
+        guard = ImportGuard([])
+        guarded = wrap_student_module(filename, allowed_libs=[],
+                                      module_name='guarded',
+                                      import_guard=guard)
+
+    add = student.add
+    orig_add = student.get_module_attribute('add')
+
+    def lookup_and_call() -> None:
+        for i in range(CALLS):
+            student.add(i, 1)
+
+    def call() -> None:
+        for i in range(CALLS):
+            add(i, 1)
+
+    def lookup_and_call_guarded() -> None:
+        for i in range(CALLS):
+            guarded.add(i, 1)
+
+    def direct() -> None:
+        for i in range(CALLS):
+            orig_add(i, 1)
+
+    benchmarks: Dict[str, Callable[[], None]] = {
+        'student.add(...)': lookup_and_call,
+        'add = student.add; add(...)': call,
+        'ImportGuard: student.add(...)': lookup_and_call_guarded,
+        'unwrapped add(...)': direct,
+    }
+    with guard:
+        return {
+            name: min(timeit.repeat(benchmark, number=1, repeat=repeat))
+            / CALLS * 1e9
+            for name, benchmark in benchmarks.items()
+        }
+
+
+def main() -> None:
+    for name, ns_per_call in run().items():
+        print(f'{name:>30}: {ns_per_call:8.0f} ns/call')
+
+
+if __name__ == '__main__':
+    main()
@@ -6,12 +6,12 @@ import importlib.util
 from types import ModuleType, FunctionType
 from typing import Iterable, Any, Optional, Callable, Dict, Tuple, List
 import functools
-import copy
 import re
 import operator
 
-from utils.import_reporter import ImportReporter, BadImport
-from utils.args_mutability import is_mutable_arg_default_value
+from utils.import_reporter import ImportGuard, ImportReporter, BadImport
+from utils.args_mutability import ArgsSnapshot, is_mutable_arg_default_value
+from utils.budget import Budget, BudgetExceeded, BudgetLimiter
 
 
 class CheckerError(Exception):
@@ -38,6 +38,18 @@ class EMutableArg(CheckerError):
     pass
 
 
+class EBudgetExceeded(CheckerError):
+    pass
+
+
+class ETimeout(EBudgetExceeded):
+    pass
+
+
+class EComplexity(CheckerError):
+    pass
+
+
 def exception_str(exc: BaseException) -> str:
     """Return message of the exception."""
     exc_description = type(exc).__name__
@@ -62,11 +74,16 @@ def import_file(name: str, filename: str) -> ModuleType:
 def wrap_student_module(filename: str,
                         allowed_libs: Iterable[str],
                         check_stdout: bool = False,
-                        module_name: str = 'student') -> ModuleType:
+                        module_name: str = 'student',
+                        import_guard: Optional[ImportGuard] = None
+                        ) -> ModuleType:
     """Import a student module and wrap all calls with ImportReporter.
     This needs Python 3.7.
     If check_stdout is True, asserts that nothing is written on stdout
     during importing.
+    If import_guard is given, the module is registered to it and the guard
+    is installed instead; functions are then returned without wrappers
+    (call them inside 'with import_guard' to hide builtins.__loader__ too).
     """
     c_stdout = StringIO() if check_stdout else None
 
@@ -81,11 +98,21 @@ def wrap_student_module(filename: str,
             "Řešení obsahuje kód, který se vykonává mimo funkce."
         )
 
+    if import_guard is not None:
+        import_guard.register(orig_module)
+        import_guard.install()
+
     wrapped_module = ModuleType('student')
+    # name -> (wrapped attribute, wrapper); the wrapper is reused as long as
+    # the attribute of the original module stays the same object
+    wrappers: Dict[str, Tuple[Any, Callable[..., Any]]] = {}
 
     def __getattr__(name: str) -> Any:
         attr = getattr(orig_module, name)
-        if not callable(attr):
+        cached = wrappers.get(name)
+        if cached is not None and cached[0] is attr:
+            return cached[1]
+        if not callable(attr) or import_guard is not None:
             return attr
 
         def wrapper(*args: Any, **kwargs: Any) -> Any:
@@ -93,6 +120,7 @@ def wrap_student_module(filename: str,
                 return attr(*args, **kwargs)
 
         functools.update_wrapper(wrapper, attr)
+        wrappers[name] = (attr, wrapper)
         return wrapper
 
     def get_module_attribute(name: str) -> Any:
@@ -100,6 +128,7 @@ def wrap_student_module(filename: str,
 
     def set_module_attribute(name: str, value: Any) -> None:
         setattr(orig_module, name, value)
+        wrappers.pop(name, None)
 
     setattr(wrapped_module, '__getattr__', __getattr__)
     setattr(wrapped_module, 'set_module_attribute', set_module_attribute)
@@ -158,21 +187,40 @@ def _reset_args_kwargs(*args: Any, **kwargs: Any) -> None:
             kwarg.test_reset()
 
 
+def _budget_limit_str(budget: Budget, limit: str) -> str:
+    if limit == 'cpu_time':
+        return f"limit procesorového času {budget.cpu_time:g} s"
+    if limit == 'wall_time':
+        return f"časový limit {budget.wall_time:g} s"
+    return f"paměťový limit {budget.memory / 2**20:g} MB"  # type: ignore
+
+
 def _student_exec_stdout(student_func: Callable[..., Any], *args: Any,
-                         args_str: str, **kwargs: Any) -> Tuple[Any, str]:
+                         args_str: str,
+                         exec_budget: Optional[Budget] = None,
+                         **kwargs: Any) -> Tuple[Any, str]:
     """
     Low-level execute student function and return its result & stdout.
 
     This function should not be called from outside, because it does not check
     for presence of the __name__, whether student_func is really callable, ...
     """
+    c_stdout = StringIO()
+    stack = ExitStack()
+    if exec_budget is not None:
+        # failures of the limiter itself are not errors of the student code
+        stack.enter_context(BudgetLimiter(exec_budget))
     try:
-        c_stdout = StringIO()
-        with redirect_stdout(c_stdout):
+        with stack, redirect_stdout(c_stdout):
             result = student_func(*args, **kwargs)
         return (result, c_stdout.getvalue())
     except BadImport:
         raise
+    except BudgetExceeded as exc:
+        raise EBudgetExceeded(
+            f"Funkce '{student_func.__name__}' {args_str} překročila "
+            + _budget_limit_str(exec_budget, exc.limit) + "."  # type: ignore
+        )
     except Exception as exc:  # pylint: disable=broad-except
         raise EExecError(
             f"Při pokusu o spuštění funkce '{student_func.__name__}' "
@@ -180,20 +228,18 @@ def _student_exec_stdout(student_func: Callable[..., Any], *args: Any,
         )
 
 
-def student_exec_stdout(student_func: Callable[..., Any],
-                        *args: Any,
-                        counterexample: bool = True,
-                        check_param_ro: bool = True,
-                        check_param_immutable: bool = True,
-                        user_mutable_types: Optional[List[Any]] = None,
-                        **kwargs: Any) -> Tuple[Any, str]:
+def _student_exec_stdout_checked(
+        student_func: Callable[..., Any],
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+        counterexample: bool,
+        check_param_immutable: bool,
+        user_mutable_types: Optional[List[Any]],
+        snapshot: Optional[ArgsSnapshot],
+        exec_budget: Optional[Budget] = None) -> Tuple[Any, str]:
     """
-    Execute student function and return its result & stdout.
-
-    Raise nice Exception in case of error.
-    Optinal checks:
-     * function does not modify its parameters
-     * function does not use immutable default value of a parameter
+    Body of student_exec_stdout, arguments are checked against 'snapshot'
+    (taken before the call) unless it is None.
     """
     if not callable(student_func) or not hasattr(student_func, '__name__'):
         raise ENoFunction(f"Nelze zavolat {str(student_func)}, není funkce!")
@@ -211,17 +257,14 @@ def student_exec_stdout(student_func: Callable[..., Any],
     else:
         args_str = ''
 
-    if check_param_ro:
-        orig_args = copy.deepcopy(args)
-        orig_kwargs = copy.deepcopy(kwargs)
-
     _reset_args_kwargs(*args, **kwargs)
 
     result = _student_exec_stdout(
-        student_func, *args, args_str=args_str, **kwargs
+        student_func, *args, args_str=args_str, exec_budget=exec_budget,
+        **kwargs
     )
 
-    if (check_param_ro and (args != orig_args or kwargs != orig_kwargs)):
+    if snapshot is not None and not snapshot.unchanged(args, kwargs):
         raise EArgumentChanged(
             f"Vaše funkce '{student_func.__name__}' změnila argumenty, což je "
             "zakázáno!"
@@ -230,29 +273,135 @@ def student_exec_stdout(student_func: Callable[..., Any],
     return result
 
 
+def _student_exec_checked(
+        student_func: Callable[..., Any],
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+        counterexample: bool,
+        check_param_immutable: bool,
+        user_mutable_types: Optional[List[Any]],
+        snapshot: Optional[ArgsSnapshot],
+        exec_budget: Optional[Budget] = None) -> Any:
+    """Body of student_exec, see _student_exec_stdout_checked."""
+    result, stdout = _student_exec_stdout_checked(
+        student_func, args, kwargs, counterexample, check_param_immutable,
+        user_mutable_types, snapshot, exec_budget
+    )
+    if stdout != '':
+        raise EWritingToStdout(
+            f"Funkce '{student_func.__name__}' píše na výstup "
+            "i když nemá psát!"
+        )
+    return result
+
+
+def student_exec_stdout(student_func: Callable[..., Any],
+                        *args: Any,
+                        counterexample: bool = True,
+                        check_param_ro: bool = True,
+                        check_param_immutable: bool = True,
+                        user_mutable_types: Optional[List[Any]] = None,
+                        exec_budget: Optional[Budget] = None,
+                        **kwargs: Any) -> Tuple[Any, str]:
+    """
+    Execute student function and return its result & stdout.
+
+    Raise nice Exception in case of error.
+    Optinal checks:
+     * function does not modify its parameters
+     * function does not use immutable default value of a parameter
+     * function stays within exec_budget (CPU time, wall-clock time, memory)
+    """
+    snapshot = ArgsSnapshot(args, kwargs) if check_param_ro else None
+    return _student_exec_stdout_checked(
+        student_func, args, kwargs, counterexample, check_param_immutable,
+        user_mutable_types, snapshot, exec_budget
+    )
+
+
 def student_exec(student_func: Callable[..., Any],
                  *args: Any,
                  counterexample: bool = True,
                  check_param_ro: bool = True,
                  check_param_immutable: bool = True,
                  user_mutable_types: Optional[List[Any]] = None,
+                 exec_budget: Optional[Budget] = None,
                  **kwargs: Any) -> Any:
     """
     Execute student function and return its result. Function is checked for
     empty stdout.
     """
-    result, stdout = student_exec_stdout(
-        student_func, *args, counterexample=counterexample,
-        check_param_ro=check_param_ro,
-        check_param_immutable=check_param_immutable,
-        user_mutable_types=user_mutable_types, **kwargs
+    snapshot = ArgsSnapshot(args, kwargs) if check_param_ro else None
+    return _student_exec_checked(
+        student_func, args, kwargs, counterexample, check_param_immutable,
+        user_mutable_types, snapshot, exec_budget
+    )
+
+
+def student_run(student_func: Callable[..., Any],
+                args: Tuple[Any, ...] = (),
+                kwargs: Optional[Dict[str, Any]] = None,
+                args_str: str = '',
+                exec_budget: Optional[Budget] = None) -> Tuple[Any, str]:
+    """
+    Execute student function with as little overhead as possible (e.g. for
+    measuring its runtime) and return its result & stdout. Errors are
+    reported as in student_exec_stdout, but no checks are done; 'args_str'
+    describes the input in the messages.
+    """
+    if not callable(student_func) or not hasattr(student_func, '__name__'):
+        raise ENoFunction(f"Nelze zavolat {str(student_func)}, není funkce!")
+    return _student_exec_stdout(student_func, *args, args_str=args_str,
+                                exec_budget=exec_budget, **(kwargs or {}))
+
+
+def _student_test_checked(
+        student_func: Callable[..., Any],
+        expected: Any,
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+        comparator: Callable[[Any, Any], bool],
+        counterexample: bool,
+        check_param_immutable: bool,
+        user_mutable_types: Optional[List[Any]],
+        snapshot: Optional[ArgsSnapshot],
+        exec_budget: Optional[Budget] = None) -> None:
+    """Body of student_test_expected, see _student_exec_stdout_checked."""
+    result = _student_exec_checked(
+        student_func, args, kwargs, counterexample, check_param_immutable,
+        user_mutable_types, snapshot, exec_budget
+    )
+
+    if not comparator(result, expected):
+        if counterexample:
+            str_args = stringify_args_human_readable(*args, **kwargs)
+            args_str = f'na vstupu {str_args}'
+        else:
+            args_str = ''
+        assert False, \
+            (f"Výstup vaši funkce '{student_func.__name__}' {args_str} "
+             "neodpovídá očekávánému výstupu.")
+
+
+def student_test_expected(student_func: Callable[..., Any],
+                          expected: Any,
+                          *args: Any,
+                          comparator: Callable[[Any, Any], bool] = operator.eq,
+                          counterexample: bool = True,
+                          check_param_ro: bool = True,
+                          check_param_immutable: bool = True,
+                          user_mutable_types: Optional[List[Any]] = None,
+                          exec_budget: Optional[Budget] = None,
+                          **kwargs: Any) -> None:
+    """
+    Test single student function against an already known expected output
+    (e.g. from utils.golden_corpus).
+    """
+    snapshot = ArgsSnapshot(args, kwargs) if check_param_ro else None
+    _student_test_checked(
+        student_func, expected, args, kwargs, comparator, counterexample,
+        check_param_immutable, user_mutable_types, snapshot, exec_budget
     )
-    if stdout != '':
-        raise EWritingToStdout(
-            f"Funkce '{student_func.__name__}' píše na výstup "
-            "i když nemá psát!"
-        )
-    return result
 
 
 def student_test(student_func: Callable[..., Any],
@@ -263,36 +412,24 @@ def student_test(student_func: Callable[..., Any],
                  check_param_ro: bool = True,
                  check_param_immutable: bool = True,
                  user_mutable_types: Optional[List[Any]] = None,
+                 exec_budget: Optional[Budget] = None,
                  **kwargs: Any) -> None:
     """Test single student function."""
-    if check_param_ro:
-        orig_args = copy.deepcopy(args)
-        orig_kwargs = copy.deepcopy(kwargs)
+    # one snapshot serves both the teacher and the student check
+    snapshot = ArgsSnapshot(args, kwargs) if check_param_ro else None
 
     expected = teacher_func(*args, **kwargs)
-    if check_param_ro and (args != orig_args or kwargs != orig_kwargs):
+    if snapshot is not None and not snapshot.unchanged(args, kwargs):
         raise EArgumentChanged(
             f"Učitelská funkce '{teacher_func.__name__}' změnila argumenty, "
             "napište do diskuze!"
         )
 
-    result = student_exec(
-        student_func, *args, counterexample=counterexample,
-        check_param_ro=check_param_ro,
-        check_param_immutable=check_param_immutable,
-        user_mutable_types=user_mutable_types, **kwargs
+    _student_test_checked(
+        student_func, expected, args, kwargs, comparator, counterexample,
+        check_param_immutable, user_mutable_types, snapshot, exec_budget
     )
 
-    if not comparator(result, expected):
-        if counterexample:
-            str_args = stringify_args_human_readable(*args, **kwargs)
-            args_str = f'na vstupu {str_args}'
-        else:
-            args_str = ''
-        assert False, \
-            (f"Výstup vaši funkce '{student_func.__name__}' {args_str} "
-             "neodpovídá očekávánému výstupu.")
-
 
 def student_mock(module: ModuleType, items: Dict[str, Any]) -> Dict[str, Any]:
     """Mock student names 'items.keys()' to anthing."""
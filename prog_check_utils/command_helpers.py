@@ -1,40 +1,74 @@
 """
 Check student's codes with flake8 & mypy tool
 Reqired: working 'flake8'/'mypy' from command line
+Optional: 'dmypy' or the mypy package for MypyDaemon
 """
 
+import hashlib
+import os
 import subprocess
-from typing import List, Optional
+import tempfile
+from typing import Callable, Dict, List, Optional, Tuple
 import re
 
 from utils.checker_helpers import report
+from utils.result_cache import ResultCache
+
+
+def command_output(cmd: List[str], stdout: str, stderr: str) -> str:
+    """Checks the stderr of a finished command and returns its stdout"""
+    assert stderr == '', f'{cmd[0]} returned nonempty stderr!'
+    return stdout
 
 
 def _execute_command(cmd: List[str]) -> str:
     """Executes any command and returns stdout"""
     process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
                                stderr=subprocess.PIPE)
-    process.wait()
-    assert process.stderr.read().decode('utf-8') == '', \
-        f'{cmd[0]} returned nonempty stderr!'
-    return str(process.stdout.read().decode('utf-8'))
+    # reads both pipes while waiting, wait() would block on a full pipe
+    stdout, stderr = process.communicate()
+    return command_output(cmd, stdout.decode('utf-8'),
+                          stderr.decode('utf-8'))
 
 
-def flake8_stdout(filename: str) -> str:
-    """Runs flake8 on file 'filename' and returns stdout as plain string"""
-    output = _execute_command([
-        'flake8',
+def _cached_output(cache: Optional[ResultCache], tool: str,
+                   options: List[str], filename: str,
+                   produce: Callable[[], str]) -> str:
+    """Returns output of the tool from the cache or produces and stores it"""
+    if cache is None:
+        return produce()
+    key = cache.key(tool, options, filename)
+    output = cache.get(tool, key)
+    if output is None:
+        output = produce()
+        cache.put(key, output)
+    return output
+
+
+def flake8_options() -> List[str]:
+    """Options of flake8 used by all checks"""
+    return [
         '--extend-ignore=W292',
         '--disable-noqa',
         '--format=%(row)d:%(col)d: %(code)s %(text)s',
-        filename
-    ])
-    return output
+    ]
 
 
-def flake8_check(filename: str) -> bool:
-    """Prints flake8 result and outputs if code was ok"""
-    flake8_violations = flake8_stdout(filename)
+def flake8_command(filename: str) -> List[str]:
+    """Command running flake8 on file 'filename'"""
+    return ['flake8', *flake8_options(), filename]
+
+
+def flake8_stdout(filename: str, cache: Optional[ResultCache] = None) -> str:
+    """Runs flake8 on file 'filename' and returns stdout as plain string"""
+    return _cached_output(
+        cache, 'flake8', flake8_options(), filename,
+        lambda: _execute_command(flake8_command(filename))
+    )
+
+
+def flake8_report(flake8_violations: str) -> bool:
+    """Prints result of flake8 given its stdout and outputs if code was ok"""
     flake8_ok = (flake8_violations == '')
     if flake8_ok:
         report("INFO", "Gratulujeme, Váš kód splňuje požadavky na styl.")
@@ -44,25 +78,160 @@ def flake8_check(filename: str) -> bool:
     return flake8_ok
 
 
-def _strip_mypy_filename(stdout: str) -> str:
+def flake8_check(filename: str, cache: Optional[ResultCache] = None) -> bool:
+    """Prints flake8 result and outputs if code was ok"""
+    return flake8_report(flake8_stdout(filename, cache))
+
+
+def strip_mypy_filename(stdout: str) -> str:
+    """Removes the filename from the beginning of mypy output lines"""
     return '\n'.join(re.sub(r'^.*?:', '', line) for line in stdout.split('\n'))
 
 
-def mypy_stdout(filename: str, args: List[str]) -> str:
+def mypy_options(args: List[str]) -> List[str]:
+    """Options of mypy used by all checks, 'args' appended"""
+    return ['--strict', '--no-error-summary', *args]
+
+
+def mypy_command(filename: str, args: List[str]) -> List[str]:
+    """Command running mypy on file 'filename'"""
+    return ['mypy', *mypy_options(args), filename]
+
+
+class MypyDaemon:
+    """Long-lived mypy worker keeping its cache warm between submissions.
+
+    backend 'dmypy' runs one mypy daemon for every set of options (started
+    on the first use, stopped by stop()), backend 'api' runs mypy.api in
+    this process, which saves the interpreter startup and reuses the
+    incremental cache. run() returns None when the backend is not
+    available, mypy_stdout then falls back to the mypy command.
+
+    mypy considers a file unchanged if its size and mtime (in whole
+    seconds) match the last check. A resubmission of the same size written
+    to the same path within a second would be missed, so run() moves the
+    mtime of such a file one second forward."""
+
+    def __init__(self, backend: str = 'dmypy',
+                 status_dir: Optional[str] = None) -> None:
+        if backend not in ('dmypy', 'api'):
+            raise ValueError(f'unknown mypy daemon backend {backend}')
+        self.backend = backend
+        self.status_dir = status_dir or tempfile.mkdtemp(prefix='dmypy-')
+        # options -> status file of a running daemon
+        self.daemons: Dict[Tuple[str, ...], str] = {}
+        # path -> (mtime in seconds, size, content hash) of the last check
+        self.checked: Dict[str, Tuple[int, int, str]] = {}
+
+    def _mark_changed(self, filename: str) -> None:
+        path = os.path.abspath(filename)
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        st = os.stat(path)
+        if path in self.checked:
+            mtime, size, old_digest = self.checked[path]
+            if (mtime, size) == (int(st.st_mtime), st.st_size) \
+                    and digest != old_digest:
+                os.utime(path, ns=(st.st_atime_ns,
+                                   st.st_mtime_ns + 1_000_000_000))
+                st = os.stat(path)
+        self.checked[path] = (int(st.st_mtime), st.st_size, digest)
+
+    def _dmypy(self, status_file: str,
+               *args: str) -> 'subprocess.CompletedProcess[str]':
+        return subprocess.run(['dmypy', '--status-file', status_file, *args],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True, check=False)
+
+    def _start(self, options: Tuple[str, ...]) -> Optional[str]:
+        digest = hashlib.sha256('\0'.join(options).encode()).hexdigest()
+        status_file = os.path.join(self.status_dir, f'{digest[:16]}.json')
+        started = self._dmypy(status_file, 'start', '--', *options)
+        if started.returncode != 0:
+            return None
+        self.daemons[options] = status_file
+        return status_file
+
+    def _run_dmypy(self, filename: str, args: List[str]) -> Optional[str]:
+        options = tuple(mypy_options(args))
+        for _ in range(2):
+            status_file = self.daemons.get(options) or self._start(options)
+            if status_file is None:
+                return None
+            result = self._dmypy(status_file, 'check', filename)
+            # 0 = no errors, 1 = errors found, 2 = the daemon failed
+            if result.returncode in (0, 1) and result.stderr == '':
+                return result.stdout
+            # restart the daemon once
+            self._dmypy(status_file, 'kill')
+            del self.daemons[options]
+        return None
+
+    def _run_api(self, filename: str, args: List[str]) -> Optional[str]:
+        try:
+            from mypy import api  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            return None
+        stdout, stderr, status = api.run([*mypy_options(args), filename])
+        if status not in (0, 1) or stderr != '':
+            return None
+        return stdout
+
+    def run(self, filename: str, args: List[str]) -> Optional[str]:
+        """Returns mypy stdout (not stripped) or None if not available"""
+        try:
+            self._mark_changed(filename)
+            if self.backend == 'api':
+                return self._run_api(filename, args)
+            return self._run_dmypy(filename, args)
+        except OSError:
+            return None
+
+    def stop(self) -> None:
+        for status_file in self.daemons.values():
+            try:
+                self._dmypy(status_file, 'stop')
+            except OSError:
+                pass
+        self.daemons.clear()
+
+    def __enter__(self) -> 'MypyDaemon':
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.stop()
+
+
+def _mypy_run(filename: str, args: List[str],
+              daemon: Optional[MypyDaemon]) -> str:
+    output = daemon.run(filename, args) if daemon is not None else None
+    if output is None:
+        output = _execute_command(mypy_command(filename, args))
+    return strip_mypy_filename(output)
+
+
+def mypy_stdout(filename: str, args: List[str],
+                daemon: Optional[MypyDaemon] = None,
+                cache: Optional[ResultCache] = None) -> str:
     """Runs mypy on file 'filename' and returns stdout as plain string"""
-    command = ['mypy', '--strict', '--no-error-summary']
-    command.extend(args)
-    command.append(filename)
-    output = _execute_command(command)
-    return _strip_mypy_filename(output)
+    return _cached_output(cache, 'mypy', mypy_options(args), filename,
+                          lambda: _mypy_run(filename, args, daemon))
 
 
 def mypy_check(
-        filename: str, additional_args: Optional[List[str]] = None) -> bool:
+        filename: str, additional_args: Optional[List[str]] = None,
+        daemon: Optional[MypyDaemon] = None,
+        cache: Optional[ResultCache] = None) -> bool:
     """Prints mypy result and outputs if code was ok"""
     if additional_args is None:
         additional_args = []
-    mypy_violations = mypy_stdout(filename, additional_args)
+    return mypy_report(
+        mypy_stdout(filename, additional_args, daemon, cache)
+    )
+
+
+def mypy_report(mypy_violations: str) -> bool:
+    """Prints result of mypy given its stdout and outputs if code was ok"""
     mypy_ok = (mypy_violations == '')
     if mypy_ok:
         report("INFO", "Gratulujeme, Váš kód splňuje požadavky na typování.")
@@ -0,0 +1,177 @@
+"""
+Empirical check of the time complexity of student functions.
+
+Usage:
+    student_complexity(student.sort, lambda n: (random_list(n),),
+                       allowed='O(n log n)')
+
+The function is run on inputs of increasing size (after a warm-up, the
+median of several repeats is taken) and the runtimes are fitted by
+t = a + b * f(n) for every growth class f. The check fails only if
+no allowed class fits within the noise and a slower class fits
+significantly better, i.e. close classes such as O(n) and O(n log n) are
+usually not told apart. The sizes should span at least an order of
+magnitude and the largest inputs should run for milliseconds, otherwise
+the measurement is dominated by noise. Every call is limited to
+DEFAULT_BUDGET, a function exceeding it fails with EBudgetExceeded.
+"""
+
+import gc
+import math
+import statistics
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from utils.budget import Budget
+from utils.checker_helpers import EComplexity, student_run
+
+DEFAULT_SIZES = tuple(100 * 2**i for i in range(8))
+REPEATS = 5
+WARMUP = 1
+# classes with the error up to this multiple of the best one fit as well
+FIT_TOLERANCE = 1.1
+# differences of runtimes below this are considered noise (seconds)
+RESOLUTION = 1e-4
+# relative error of a fit considered noise
+NOISE = 0.2
+# a slower class has to fit this many times better to fail the check
+SIGNIFICANCE = 2.0
+# limit of a single call, so that e.g. an exponential function fails
+# instead of running (almost) forever on the large sizes
+DEFAULT_BUDGET = Budget(wall_time=10.0)
+
+
+def _log(n: float) -> float:
+    return math.log(max(n, 2))
+
+
+# growth classes from the slowest, f(n, n_max) normalized to f(n_max) = 1
+GROWTH_CLASSES: List[Tuple[str, Callable[[int, int], float]]] = [
+    ('O(1)', lambda n, m: 1.0),
+    ('O(log n)', lambda n, m: _log(n) / _log(m)),
+    ('O(n)', lambda n, m: n / m),
+    ('O(n log n)', lambda n, m: n * _log(n) / (m * _log(m))),
+    ('O(n^2)', lambda n, m: (n / m) ** 2),
+    ('O(n^3)', lambda n, m: (n / m) ** 3),
+    ('O(2^n)', lambda n, m: 2.0 ** (n - m)),
+]
+GROWTH_NAMES = [name for name, _ in GROWTH_CLASSES]
+
+
+def measure(func: Callable[..., Any],
+            make_input: Callable[[int], Tuple[Any, ...]],
+            sizes: Sequence[int] = DEFAULT_SIZES,
+            repeats: int = REPEATS,
+            warmup: int = WARMUP,
+            exec_budget: Optional[Budget] = DEFAULT_BUDGET) -> List[float]:
+    """
+    Return the median runtime of func(*make_input(n)) for every size n.
+    A new input is generated for every call (outside of the measured time).
+    The garbage collector is disabled during the calls (as in timeit),
+    otherwise its passes over the input would be measured as well.
+    Every call is limited by 'exec_budget' (None for no limit, the time
+    limits work in the main thread only).
+    """
+    times = []
+    gc_enabled = gc.isenabled()
+    try:
+        for n in sizes:
+            samples = []
+            for i in range(warmup + repeats):
+                args = make_input(n)
+                gc.collect()
+                gc.disable()
+                start = time.perf_counter()
+                student_run(func, args, args_str=f'pro n = {n}',
+                            exec_budget=exec_budget)
+                elapsed = time.perf_counter() - start
+                if gc_enabled:
+                    gc.enable()
+                if i >= warmup:
+                    samples.append(elapsed)
+            times.append(statistics.median(samples))
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return times
+
+
+def _fit(xs: Sequence[float], ts: Sequence[float]) -> float:
+    """
+    Least squares fit of t = a + b * x (a, b >= 0) with relative errors
+    (runtimes below RESOLUTION are weighted as RESOLUTION), return the root
+    mean square error.
+    """
+    ws = [1 / max(t, RESOLUTION) ** 2 for t in ts]
+    sw = sum(ws)
+    swx = sum(w * x for w, x in zip(ws, xs))
+    swt = sum(w * t for w, t in zip(ws, ts))
+    swxx = sum(w * x * x for w, x in zip(ws, xs))
+    swxt = sum(w * x * t for w, x, t in zip(ws, xs, ts))
+    det = sw * swxx - swx * swx
+    a = b = 0.0
+    if det > 0:
+        a = (swxx * swt - swx * swxt) / det
+        b = (sw * swxt - swx * swt) / det
+    if det <= 0 or b < 0:
+        a, b = swt / sw, 0.0
+    elif a < 0:
+        a, b = 0.0, swxt / swxx
+    return math.sqrt(sum(w * (t - a - b * x) ** 2
+                         for w, x, t in zip(ws, xs, ts)) / len(ts))
+
+
+def growth_errors(sizes: Sequence[int], times: Sequence[float]
+                  ) -> List[float]:
+    """Return the error of the fit for every class of GROWTH_CLASSES."""
+    n_max = max(sizes)
+    return [_fit([f(n, n_max) for n in sizes], times)
+            for _, f in GROWTH_CLASSES]
+
+
+def fit_growth(sizes: Sequence[int], times: Sequence[float]) -> str:
+    """Return name of the slowest growing class fitting the runtimes."""
+    errors = growth_errors(sizes, times)
+    best = min(errors)
+    for name, error in zip(GROWTH_NAMES, errors):
+        if error <= best * FIT_TOLERANCE + 1e-12:
+            return name
+    return GROWTH_NAMES[-1]  # not reached
+
+
+def student_complexity(student_func: Callable[..., Any],
+                       make_input: Callable[[int], Tuple[Any, ...]],
+                       allowed: Optional[str] = None,
+                       teacher_func: Optional[Callable[..., Any]] = None,
+                       sizes: Sequence[int] = DEFAULT_SIZES,
+                       repeats: int = REPEATS,
+                       warmup: int = WARMUP,
+                       exec_budget: Optional[Budget] = DEFAULT_BUDGET,
+                       noise: float = NOISE) -> str:
+    """
+    Check that the student function grows at most as fast as 'allowed'
+    (one of GROWTH_NAMES) or, if 'allowed' is None, as the teacher function.
+    make_input(n) returns a tuple of arguments of size n. Return the
+    measured growth class of the student function.
+    """
+    if allowed is None:
+        if teacher_func is None:
+            raise ValueError('allowed or teacher_func has to be given')
+        allowed = fit_growth(sizes, measure(teacher_func, make_input, sizes,
+                                            repeats, warmup, exec_budget))
+    elif allowed not in GROWTH_NAMES:
+        raise ValueError(f'unknown growth class {allowed}')
+
+    times = measure(student_func, make_input, sizes, repeats, warmup,
+                    exec_budget)
+    errors = growth_errors(sizes, times)
+    limit = GROWTH_NAMES.index(allowed) + 1
+    allowed_error = min(errors[:limit])
+    growth = fit_growth(sizes, times)
+    if limit < len(errors) and allowed_error > noise \
+            and allowed_error > min(errors[limit:]) * SIGNIFICANCE:
+        raise EComplexity(
+            f"Funkce '{student_func.__name__}' je příliš pomalá: její doba "
+            f"běhu roste jako {growth}, povoleno je nejvýše {allowed}."
+        )
+    return growth
@@ -0,0 +1,187 @@
+"""
+Golden test corpus: test inputs with outputs of the teacher function
+computed once and stored on disk, shared by all students.
+
+Usage:
+    corpus = golden_corpus(teacher_func, lambda: [(1, 2), (3, 4)])
+    corpus.test(student.func)
+
+The corpus file is named after the teacher function and a hash of its
+source and of the inputs (the source of the input generator, or the
+pickled inputs themselves), so it is regenerated whenever any of them
+changes. The file is a stream of pickles:
+    MAGIC, pickled key, pickled cases ..., index of case offsets
+    (array of uint64), little-endian uint64 offset of the index.
+Only the index is kept in memory, cases are unpickled lazily one by one
+(the file is open only while reading them), so every access returns fresh
+copies of the arguments.
+"""
+
+import hashlib
+import inspect
+import marshal
+import operator
+import os
+import pickle
+import struct
+import sys
+import tempfile
+from array import array
+from typing import (Any, Callable, Dict, Iterable, Iterator, List,
+                    NamedTuple, Optional, Tuple, Union)
+
+from utils.args_mutability import ArgsSnapshot
+from utils.budget import Budget
+from utils.checker_helpers import EArgumentChanged, student_test_expected
+
+MAGIC = b'KSIgold\x01'
+DEFAULT_DIRECTORY = '.golden'
+
+
+class TestInput(NamedTuple):
+    args: Tuple[Any, ...]
+    kwargs: Dict[str, Any]
+
+
+class GoldenCase(NamedTuple):
+    args: Tuple[Any, ...]
+    kwargs: Dict[str, Any]
+    expected: Any
+
+
+Inputs = Iterable[Union[Tuple[Any, ...], TestInput]]
+
+
+def test_input(*args: Any, **kwargs: Any) -> TestInput:
+    """Input with keyword arguments, plain tuples are positional only."""
+    return TestInput(args, kwargs)
+
+
+def source_hash(*funcs: Callable[..., Any]) -> str:
+    """Hash of the source code of the functions."""
+    digest = hashlib.sha256()
+    for func in funcs:
+        try:
+            digest.update(inspect.getsource(func).encode('utf-8'))
+        except (OSError, TypeError):
+            digest.update(marshal.dumps(func.__code__))
+    return digest.hexdigest()
+
+
+class GoldenCorpus:
+    """Lazily loaded corpus file, see the module docstring."""
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{filename} is not a golden corpus')
+            self.key: str = pickle.load(f)
+            f.seek(-8, os.SEEK_END)
+            index_offset, = struct.unpack('<Q', f.read(8))
+            f.seek(index_offset)
+            self._offsets = array('Q')
+            self._offsets.frombytes(pickle.load(f))
+            if sys.byteorder == 'big':
+                self._offsets.byteswap()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, i: int) -> GoldenCase:
+        with open(self.filename, 'rb') as f:
+            f.seek(self._offsets[i])
+            return GoldenCase(*pickle.load(f))
+
+    def __iter__(self) -> Iterator[GoldenCase]:
+        with open(self.filename, 'rb') as f:
+            for offset in self._offsets:
+                f.seek(offset)
+                yield GoldenCase(*pickle.load(f))
+
+    def test(self, student_func: Callable[..., Any],
+             comparator: Callable[[Any, Any], bool] = operator.eq,
+             counterexample: bool = True,
+             check_param_ro: bool = True,
+             check_param_immutable: bool = True,
+             user_mutable_types: Optional[List[Any]] = None,
+             exec_budget: Optional[Budget] = None) -> None:
+        """Test the student function on all cases (see student_test)."""
+        for case in self:
+            student_test_expected(
+                student_func, case.expected, *case.args,
+                comparator=comparator,
+                counterexample=counterexample,
+                check_param_ro=check_param_ro,
+                check_param_immutable=check_param_immutable,
+                user_mutable_types=user_mutable_types,
+                exec_budget=exec_budget,
+                **case.kwargs
+            )
+
+
+def write_corpus(filename: str, key: str,
+                 teacher_func: Callable[..., Any], inputs: Inputs) -> None:
+    """Compute outputs of the teacher function and write the corpus."""
+    directory = os.path.dirname(filename) or '.'
+    fd, tmp_name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            pickle.dump(key, f, pickle.HIGHEST_PROTOCOL)
+            offsets = array('Q')
+            for item in inputs:
+                if isinstance(item, TestInput):
+                    args, kwargs = item
+                else:
+                    args, kwargs = tuple(item), {}
+                snapshot = ArgsSnapshot(args, kwargs)
+                expected = teacher_func(*args, **kwargs)
+                if not snapshot.unchanged(args, kwargs):
+                    raise EArgumentChanged(
+                        f"Učitelská funkce '{teacher_func.__name__}' změnila "
+                        "argumenty, napište do diskuze!"
+                    )
+                offsets.append(f.tell())
+                pickle.dump((args, kwargs, expected), f,
+                            pickle.HIGHEST_PROTOCOL)
+            index_offset = f.tell()
+            if sys.byteorder == 'big':
+                offsets.byteswap()
+            pickle.dump(offsets.tobytes(), f, pickle.HIGHEST_PROTOCOL)
+            f.write(struct.pack('<Q', index_offset))
+        os.replace(tmp_name, filename)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+
+
+def golden_corpus(teacher_func: Callable[..., Any],
+                  inputs: Union[Callable[[], Inputs], Inputs],
+                  directory: str = DEFAULT_DIRECTORY) -> GoldenCorpus:
+    """
+    Return the corpus of the teacher function, generate it first if it does
+    not exist yet. 'inputs' are tuples of positional arguments or results
+    of test_input(); pass a function returning them to generate the inputs
+    only when the corpus is missing. Arguments and outputs must be picklable.
+    """
+    if callable(inputs):
+        key = source_hash(teacher_func, inputs)
+    else:
+        inputs = list(inputs)
+        digest = hashlib.sha256(source_hash(teacher_func).encode('ascii'))
+        digest.update(pickle.dumps(inputs, pickle.HIGHEST_PROTOCOL))
+        key = digest.hexdigest()
+    filename = os.path.join(directory,
+                            f'{teacher_func.__name__}-{key[:16]}.golden')
+
+    if os.path.exists(filename):
+        corpus = GoldenCorpus(filename)
+        if corpus.key == key:
+            return corpus
+
+    os.makedirs(directory, exist_ok=True)
+    write_corpus(filename, key, teacher_func,
+                 inputs() if callable(inputs) else inputs)
+    return GoldenCorpus(filename)
@@ -1,6 +1,8 @@
-"""ImportReporter"""
+"""ImportReporter and ImportGuard"""
 
 import builtins
+import sys
+import threading
 from collections import defaultdict
 from types import ModuleType
 from typing import Callable, Iterable, Dict, Tuple, List, Any, Optional
@@ -10,6 +12,21 @@ class BadImport(Exception):
     """Raised in the case of a forbidden import attempt."""
 
 
+def compile_allowed(allowed: Iterable[str]) -> Dict[str, Tuple[str, ...]]:
+    """Convert allowed imports (see ImportReporter) to a dict
+    library -> allowed entities (empty tuple if all entities are allowed)."""
+    result: Dict[str, Tuple[str, ...]] = {}
+    allowed_entities: Dict[str, List[str]] = defaultdict(list)
+    for item in allowed:
+        lib, _, entity = item.partition('/')
+        if entity:
+            allowed_entities[lib].append(entity)
+        else:
+            result[lib] = ()  # all entities allowed
+    result.update({k: tuple(v) for k, v in allowed_entities.items()})
+    return result
+
+
 class ImportReporter:
     """Usage:
     with ImportReporter(arg):
@@ -36,15 +53,7 @@ class ImportReporter:
 
         self.new_import = new_import or self.make_importer()
         self.new_loader = loader
-        allowed_entities: Dict[str, List[str]] = defaultdict(list)
-        for item in allowed:
-            lib, _, entity = item.partition('/')
-            if entity:
-                allowed_entities[lib].append(entity)
-            else:
-                self.allowed[lib] = ()  # all entities allowed
-        self.allowed.update({k: tuple(v)
-                             for k, v in allowed_entities.items()})
+        self.allowed.update(compile_allowed(allowed))
 
     # pylint: disable=redefined-builtin,too-many-arguments
     def make_importer(self) -> Callable[[str, dict[str, Any] | None, dict[str, Any] | None, list[str] | None, int], ModuleType]:
@@ -109,6 +118,146 @@ class ImportReporter:
             builtins.__loader__ = self.orig_loader
 
 
+class ImportGuard:
+    """Usage:
+    guard = ImportGuard(allowed)
+    guard.register(student_module)
+    with guard:
+        run some code
+
+    Session-wide variant of ImportReporter with the same format of allowed
+    imports. The guard replaces __import__ once (install()) and checks only
+    imports executed directly by code of a registered module (also through
+    exec or eval), other imports, including those done by libraries, are
+    passed through. Calls into the registered modules thus need no per-call
+    setup. builtins.__loader__ is hidden only inside 'with guard' blocks,
+    which should enclose the calls of the student code.
+    Decisions for every (library, fromlist) and modules filtered to the
+    allowed entities are cached.
+
+    A sys.meta_path finder or an audit hook is not sufficient: neither is
+    consulted for libraries already present in sys.modules."""
+
+    __slots__ = ('allowed', 'orig_import', 'orig_loader', 'modules',
+                 'decisions', 'filtered', 'local', 'installed', 'entered')
+
+    def __init__(self, allowed: Iterable[str]) -> None:
+        # adding _io here as workaround for strange behaviour in Python >= 3.8
+        self.allowed: Dict[str, Tuple[str, ...]] = {'_io': ()}
+        self.allowed.update(compile_allowed(allowed))
+        self.orig_import: Callable = builtins.__import__
+        self.orig_loader: Any = None
+        # id(module.__dict__) -> module
+        self.modules: Dict[int, ModuleType] = {}
+        # (name, fromlist) -> arguments of BadImport, () if allowed
+        self.decisions: Dict[Tuple[str, Tuple[str, ...]], Tuple[str, ...]] = {}
+        self.filtered: Dict[str, ModuleType] = {}
+        # local.importing: depth of allowed imports in progress in the thread
+        self.local = threading.local()
+        self.installed = False
+        # open 'with' blocks, whether each of them installed the guard
+        self.entered: List[bool] = []
+
+    def register(self, module: ModuleType) -> None:
+        """Check imports done by code of the module."""
+        self.modules[id(module.__dict__)] = module
+
+    def unregister(self, module: ModuleType) -> None:
+        self.modules.pop(id(module.__dict__), None)
+
+    def install(self) -> None:
+        if self.installed:
+            return
+        self.orig_import = builtins.__import__
+        builtins.__import__ = self.guarded_import
+        self.installed = True
+
+    def uninstall(self) -> None:
+        if not self.installed:
+            return
+        builtins.__import__ = self.orig_import
+        self.installed = False
+
+    def __enter__(self) -> 'ImportGuard':
+        if not self.entered:
+            self.orig_loader = builtins.__loader__ \
+                if hasattr(builtins, '__loader__') else None
+            builtins.__loader__ = None
+        self.entered.append(not self.installed)
+        self.install()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        if self.entered.pop():
+            self.uninstall()
+        if not self.entered and self.orig_loader:
+            builtins.__loader__ = self.orig_loader
+
+    def is_guarded(self, frame: Any) -> bool:
+        """Is the frame (the importer) code of a registered module?"""
+        return id(frame.f_globals) in self.modules
+
+    def decide(self, name: str, fromlist: Tuple[str, ...]) -> Tuple[str, ...]:
+        allowed_entities = self.allowed.get(name)
+        if allowed_entities is None:
+            return (name,)
+        if allowed_entities:
+            if not fromlist:
+                return (name,)
+            for entity in fromlist:
+                if entity not in allowed_entities:
+                    return (name, entity)
+        return ()
+
+    # pylint: disable=redefined-builtin,too-many-arguments
+    def guarded_import(self, name: str,
+                       globals_: Optional[Dict[str, Any]] = None,
+                       locals_: Optional[Dict[str, Any]] = None,
+                       fromlist: Optional[List[str]] = None,
+                       level: int = 0) -> ModuleType:
+        # globals_ are not trusted, they may be passed to __import__ directly
+        if getattr(self.local, 'importing', 0) \
+                or not self.is_guarded(sys._getframe(1)):
+            return self.orig_import(name, globals_, locals_, fromlist, level)
+
+        key = (name, tuple(fromlist) if fromlist else ())
+        denied = self.decisions.get(key)
+        if denied is None:
+            denied = self.decisions[key] = self.decide(*key)
+        if denied:
+            raise BadImport(*denied)
+
+        # the imported library may import other libraries
+        local = self.local
+        local.importing = getattr(local, 'importing', 0) + 1
+        try:
+            result = self.orig_import(name, globals_, locals_, fromlist, level)
+        finally:
+            local.importing -= 1
+
+        try:
+            result.__dict__['__loader__'] = None
+        except (AttributeError, TypeError, KeyError):
+            pass
+        try:
+            result.__dict__['importer'] = self.guarded_import
+        except (AttributeError, TypeError, KeyError):
+            pass
+
+        allowed_entities = self.allowed[name]
+        if not allowed_entities:
+            return result
+
+        module = self.filtered.get(name)
+        if module is None:
+            module = ModuleType(result.__name__)
+            module.__package__ = result.__package__
+            for entity in allowed_entities:
+                setattr(module, entity, getattr(result, entity))
+            self.filtered[name] = module
+        return module
+
+
 if __name__ == "__main__":
     def test():
         with ImportReporter(['math', 'sys']):
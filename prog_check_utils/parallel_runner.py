@@ -0,0 +1,222 @@
+"""
+Parallel execution of student_test cases with per-case timeouts.
+
+Usage:
+    student = wrap_student_module('student.py', allowed_libs)
+    cases = [test_case('fib', teacher_fib, n) for n in range(30)]
+    student_test_parallel(student, cases, timeout=2.0)
+
+The workers are forked from the grading process, so they share the already
+imported student module and the list of cases; only case indices and
+results go through pipes. A case running longer than its timeout kills its
+worker, a new one is forked in its place. This needs the 'fork' start
+method (i.e. not Windows).
+"""
+
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import Connection, wait
+from types import ModuleType
+from typing import (Any, Callable, Dict, List, NamedTuple, Optional,
+                    Sequence, Tuple)
+
+from utils.checker_helpers import (EExecError, ETimeout, exception_str,
+                                   stringify_args_human_readable,
+                                   student_function, student_test)
+
+DEFAULT_TIMEOUT = 10.0
+
+# keyword arguments of student_test which are not passed to the function
+OPTIONS = ('comparator', 'counterexample', 'check_param_ro',
+           'check_param_immutable', 'user_mutable_types', 'exec_budget')
+
+
+class TestCase(NamedTuple):
+    func_name: str
+    teacher_func: Callable[..., Any]
+    args: Tuple[Any, ...]
+    kwargs: Dict[str, Any]
+    options: Dict[str, Any]
+    timeout: Optional[float]
+
+
+def test_case(func_name: str, teacher_func: Callable[..., Any], *args: Any,
+              timeout: Optional[float] = None, **kwargs: Any) -> TestCase:
+    """
+    Case of student_test(student.func_name, teacher_func, *args, **kwargs),
+    'timeout' overrides the default timeout of the runner.
+    """
+    options = {name: kwargs.pop(name) for name in OPTIONS if name in kwargs}
+    return TestCase(func_name, teacher_func, args, kwargs, options, timeout)
+
+
+def run_case(student_module: ModuleType, case: TestCase) -> None:
+    student_test(student_function(student_module, case.func_name),
+                 case.teacher_func, *case.args, **case.options, **case.kwargs)
+
+
+def _case_timeout(case: TestCase, timeout: float) -> float:
+    return timeout if case.timeout is None else case.timeout
+
+
+def _timeout_error(case: TestCase, timeout: float) -> ETimeout:
+    args_str = ''
+    if case.options.get('counterexample', True):
+        str_args = stringify_args_human_readable(*case.args, **case.kwargs)
+        args_str = f' na vstupu {str_args}'
+    return ETimeout(f"Funkce '{case.func_name}'{args_str} nedoběhla "
+                    f"v časovém limitu {timeout:g} s.")
+
+
+def _worker_main(conn: Connection, student_module: ModuleType,
+                 cases: Sequence[TestCase]) -> None:
+    while True:
+        try:
+            i = conn.recv()
+        except EOFError:
+            return
+        if i is None:
+            return
+        error: Optional[BaseException] = None
+        try:
+            run_case(student_module, cases[i])
+        except BaseException as exc:  # pylint: disable=broad-except
+            error = exc
+        try:
+            conn.send((i, error))
+        except Exception:  # pylint: disable=broad-except
+            # unpicklable exception
+            conn.send((i, EExecError(exception_str(error))))  # type: ignore
+
+
+class _Worker:
+    __slots__ = ('process', 'conn', 'case', 'deadline')
+
+    def __init__(self, student_module: ModuleType,
+                 cases: Sequence[TestCase]) -> None:
+        ctx = multiprocessing.get_context('fork')
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, daemon=True,
+                                   args=(child_conn, student_module, cases))
+        self.process.start()
+        child_conn.close()
+        self.case: Optional[int] = None
+        self.deadline = 0.0
+
+    def start(self, i: int, timeout: float) -> None:
+        self.conn.send(i)
+        self.case = i
+        self.deadline = time.monotonic() + timeout
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+def run_parallel(student_module: ModuleType,
+                 cases: Sequence[TestCase],
+                 timeout: float = DEFAULT_TIMEOUT,
+                 processes: Optional[int] = None,
+                 stop_on_failure: bool = False
+                 ) -> List[Optional[BaseException]]:
+    """
+    Run all cases, return their errors in the input order (None for passed
+    cases). With stop_on_failure, the cases after the first failing one
+    may not be run (None is returned for them).
+    """
+    results: List[Optional[BaseException]] = [None] * len(cases)
+    if not cases:
+        return results
+    processes = min(processes or os.cpu_count() or 1, len(cases))
+    workers = [_Worker(student_module, cases) for _ in range(processes)]
+    next_case = 0
+    # the first not finished case and the first failed one
+    finished = [False] * len(cases)
+    first_unfinished = 0
+    first_failed = len(cases)
+
+    def finish(i: int, error: Optional[BaseException]) -> None:
+        nonlocal first_unfinished, first_failed
+        results[i] = error
+        finished[i] = True
+        if error is not None:
+            first_failed = min(first_failed, i)
+        while first_unfinished < len(cases) and finished[first_unfinished]:
+            first_unfinished += 1
+
+    try:
+        while first_unfinished < len(cases):
+            if stop_on_failure and first_unfinished > first_failed:
+                break
+            for worker in workers:
+                if worker.case is None and next_case < len(cases) \
+                        and not (stop_on_failure and next_case > first_failed):
+                    case = cases[next_case]
+                    worker.start(next_case, _case_timeout(case, timeout))
+                    next_case += 1
+
+            busy = [worker for worker in workers if worker.case is not None]
+            if not busy:
+                break
+            remaining = min(worker.deadline for worker in busy) \
+                - time.monotonic()
+            ready = wait([worker.conn for worker in busy],
+                         max(remaining, 0))
+
+            for index, worker in enumerate(workers):
+                if worker.case is None:
+                    continue
+                i = worker.case
+                if worker.conn in ready:
+                    try:
+                        _, error = worker.conn.recv()
+                    except EOFError:
+                        # the student code killed the worker
+                        error = EExecError(
+                            f"Při spuštění funkce '{cases[i].func_name}' "
+                            "došlo k pádu interpretu."
+                        )
+                        worker.kill()
+                        workers[index] = _Worker(student_module, cases)
+                    else:
+                        worker.case = None
+                    finish(i, error)
+                elif time.monotonic() >= worker.deadline:
+                    worker.kill()
+                    workers[index] = _Worker(student_module, cases)
+                    finish(i, _timeout_error(
+                        cases[i], _case_timeout(cases[i], timeout)))
+    finally:
+        for worker in workers:
+            if worker.case is None:
+                worker.stop()
+            else:
+                worker.kill()
+    return results
+
+
+def student_test_parallel(student_module: ModuleType,
+                          cases: Sequence[TestCase],
+                          timeout: float = DEFAULT_TIMEOUT,
+                          processes: Optional[int] = None) -> None:
+    """
+    Parallel variant of calling student_test on every case, raises the error
+    of the first failing case (in the input order).
+    """
+    for error in run_parallel(student_module, cases, timeout, processes,
+                              stop_on_failure=True):
+        if error is not None:
+            raise error
@@ -0,0 +1,217 @@
+"""
+On-disk cache of flake8/mypy outputs shared by all submissions.
+
+The key is a hash of the checked file content, its base name, the tool,
+the tool version, the exact argument list and the configuration files
+the tool reads from the current directory (CONFIG_FILES), so resubmitting
+the same file returns the stored output without running the tool. For
+mypy, the local modules imported by the file (found next to it or in the
+current directory, recursively) are part of the key as well. The cache
+directory is limited by the number of entries, the least recently used
+ones are evicted first. A cache object may be shared by threads, entries
+are written atomically.
+"""
+
+import ast
+import hashlib
+import os
+import subprocess
+import tempfile
+import threading
+from typing import Dict, List, NamedTuple, Optional, Set
+
+DEFAULT_DIRECTORY = os.environ.get(
+    'KSI_CHECK_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'ksi_checks')
+)
+DEFAULT_MAX_ENTRIES = 10000
+
+# configuration files read from the current directory
+CONFIG_FILES = {
+    'flake8': ('setup.cfg', 'tox.ini', '.flake8'),
+    'mypy': ('mypy.ini', '.mypy.ini', 'pyproject.toml', 'setup.cfg'),
+}
+# tools following the imports of the checked file
+FOLLOWS_IMPORTS = ('mypy',)
+
+
+def _imported_names(filename: str) -> Set[str]:
+    """Absolute imports of a file, empty if it cannot be parsed."""
+    try:
+        with open(filename, 'rb') as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError, ValueError):
+        return set()
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 \
+                and node.module is not None:
+            names.add(node.module)
+            names.update(f'{node.module}.{alias.name}'
+                         for alias in node.names)
+    return names
+
+
+def local_imports(filename: str) -> List[str]:
+    """
+    Sorted paths of the local modules imported by the file (directly or
+    through other local modules), looked up in its directory and in the
+    current directory.
+    """
+    roots = [os.path.dirname(os.path.abspath(filename)), os.getcwd()]
+    found: Set[str] = set()
+    todo = [filename]
+    while todo:
+        for name in _imported_names(todo.pop()):
+            parts = name.split('.')
+            for root in roots:
+                for i in range(1, len(parts) + 1):
+                    base = os.path.join(root, *parts[:i])
+                    for path in (base + '.py',
+                                 os.path.join(base, '__init__.py')):
+                        if os.path.isfile(path) and path not in found:
+                            found.add(path)
+                            todo.append(path)
+    found.discard(os.path.abspath(filename))
+    return sorted(found)
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ResultCache:
+    """Directory of tool outputs named by their keys."""
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY,
+                 max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+        self.versions: Dict[str, str] = {}
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.entries: Optional[int] = None
+        # guards the counters above and the eviction
+        self.lock = threading.Lock()
+
+    def tool_version(self, tool: str) -> str:
+        """Output of 'tool --version', run once per cache object."""
+        with self.lock:
+            if tool not in self.versions:
+                try:
+                    result = subprocess.run([tool, '--version'],
+                                            stdout=subprocess.PIPE,
+                                            stderr=subprocess.PIPE,
+                                            universal_newlines=True,
+                                            check=False)
+                    self.versions[tool] = result.stdout.strip()
+                except OSError:
+                    self.versions[tool] = ''
+            return self.versions[tool]
+
+    def key(self, tool: str, args: List[str], filename: str) -> str:
+        h = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            h.update(f.read())
+        for part in (os.path.basename(filename), tool,
+                     self.tool_version(tool), *args):
+            h.update(b'\0' + part.encode('utf-8'))
+        # (name in the key, path) of the other files the output depends on
+        inputs = [(name, name) for name in CONFIG_FILES.get(tool, ())]
+        if tool in FOLLOWS_IMPORTS:
+            # relative names, the same modules of other submissions match
+            directory = os.path.dirname(os.path.abspath(filename))
+            inputs.extend((os.path.relpath(path, directory), path)
+                          for path in local_imports(filename))
+        for name, path in inputs:
+            h.update(b'\0' + name.encode('utf-8'))
+            try:
+                with open(path, 'rb') as f:
+                    h.update(b'\1' + hashlib.sha256(f.read()).digest())
+            except OSError:
+                pass  # missing file
+        return h.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.txt')
+
+    def get(self, tool: str, key: str) -> Optional[str]:
+        path = self.path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                output = f.read()
+            os.utime(path)  # mark as recently used
+        except OSError:
+            with self.lock:
+                self.misses[tool] = self.misses.get(tool, 0) + 1
+            return None
+        with self.lock:
+            self.hits[tool] = self.hits.get(tool, 0) + 1
+        return output
+
+    def put(self, key: str, output: str) -> None:
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(output)
+        os.replace(tmp_name, self.path(key))
+        with self.lock:
+            if self.entries is None:
+                self.entries = len(self._files())
+            else:
+                self.entries += 1
+            if self.entries > self.max_entries:
+                self._evict()
+
+    def _files(self) -> List[str]:
+        return [os.path.join(self.directory, name)
+                for name in os.listdir(self.directory)
+                if name.endswith('.txt')]
+
+    def evict(self) -> None:
+        """Removes the least recently used entries over the limit."""
+        with self.lock:
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self._files():
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except OSError:
+                pass
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.entries = min(len(entries), self.max_entries)
+
+    def stats(self, tool: Optional[str] = None) -> CacheStats:
+        """Hits and misses of the tool (or of all tools) so far."""
+        with self.lock:
+            if tool is not None:
+                return CacheStats(self.hits.get(tool, 0),
+                                  self.misses.get(tool, 0))
+            return CacheStats(sum(self.hits.values()),
+                              sum(self.misses.values()))
+
+    def report(self) -> str:
+        """Hit rates as a human-readable string."""
+        with self.lock:
+            tools = sorted(set(self.hits) | set(self.misses))
+        lines = []
+        for tool in tools:
+            stats = self.stats(tool)
+            lines.append(f'{tool}: {stats.hits}/{stats.hits + stats.misses} '
+                         f'hits ({stats.hit_rate:.0%})')
+        return '\n'.join(lines)